@@ -0,0 +1,168 @@
+"""Benchmark the column encodings of the receipts table
+
+Compares the previous layout, with money as doubles, categories as
+strings and counts as 64-bit integers, with the one written by
+ingestion: money as DECIMAL, payment type and cashier as ENUMs and
+narrow integer counts. Both tables are sorted by timestamp and written
+without indexes, see `bench_lookups.py`, so only the encodings differ.
+Reports the database file size, the compression DuckDB picked for each
+column, and the latency of the aggregations behind the summary tables.
+
+    uv run benchmarks/bench_encodings.py --rows 100000 1000000 10000000
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import duckdb
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "cleannest"))
+
+import ingestion  # noqa: E402
+from pos_export import generate_receipts, write_receipt_exports  # noqa: E402
+
+
+QUERIES = {
+    "daily totals": """
+        SELECT day_key, sum(gross_sales), sum(discounts), count(*)
+        FROM receipts GROUP BY day_key
+    """,
+    "customer totals": """
+        SELECT customer_name, sum(gross_sales), sum(n_fold), count(*)
+        FROM receipts GROUP BY customer_name
+    """,
+    "payment type totals": """
+        SELECT payment_type, cashier_name, sum(total_collected)
+        FROM receipts GROUP BY ALL
+    """,
+}
+
+
+@dataclass
+class Result:
+    n_rows: int
+    layout: str
+    query: str
+    file_mb: float
+    median_ms: float
+    p95_ms: float
+
+
+def legacy_layout(receipts: pl.DataFrame) -> pl.DataFrame:
+    """The receipts as they were stored before the compact encodings"""
+    return receipts.with_columns(
+        pl.col(pl.Decimal).cast(pl.Float64),
+        pl.col(pl.Enum, pl.Categorical).cast(pl.String),
+        pl.col(pl.Int8, pl.Int16, pl.Int32).cast(pl.Int64),
+    )
+
+
+def write_legacy(con: duckdb.DuckDBPyConnection, receipts: pl.DataFrame) -> None:
+    con.register("_receipts", legacy_layout(receipts).to_arrow())
+    con.execute("CREATE TABLE receipts AS FROM _receipts ORDER BY timestamp")
+
+
+def write_compact(con: duckdb.DuckDBPyConnection, receipts: pl.DataFrame) -> None:
+    con.register("_receipts", receipts.to_arrow())
+    con.execute(
+        "CREATE TABLE receipts AS "
+        f"{ingestion._staging_projection(receipts, '_receipts')} ORDER BY timestamp"
+    )
+
+
+def column_compression(con: duckdb.DuckDBPyConnection) -> dict[str, str]:
+    """Most common compression of each column's segments"""
+    rows = con.execute("""
+        SELECT column_name, mode(compression)
+        FROM pragma_storage_info('receipts')
+        WHERE segment_type != 'VALIDITY'
+        GROUP BY column_name, column_id
+        ORDER BY column_id
+    """).fetchall()
+    return dict(rows)
+
+
+LAYOUTS = {
+    "float, strings, int64": write_legacy,
+    "decimal, enums, narrow": write_compact,
+}
+
+
+def run(n_rows: int, workdir: Path, n_customers: int, repeat: int) -> list[Result]:
+    print(f"Generating {n_rows:,} receipts...")
+    files = write_receipt_exports(
+        generate_receipts(n_rows, n_customers=n_customers), workdir / "receipts"
+    )
+    receipts, _ = ingestion._load_receipts(files)
+
+    results = []
+    for layout, write in LAYOUTS.items():
+        db = workdir / f"{layout.split(',')[0]}.db"
+        with duckdb.connect(db) as con:
+            write(con, receipts)
+            con.execute("CHECKPOINT")
+        file_mb = db.stat().st_size / 2**20
+
+        # Reopen, so that the queries read the persisted layout
+        with duckdb.connect(db, read_only=True) as con:
+            compression = column_compression(con)
+            timings = {name: [] for name in QUERIES}
+            for _ in range(repeat):
+                for name, query in QUERIES.items():
+                    start = time.perf_counter()
+                    con.execute(query).fetchall()
+                    timings[name].append((time.perf_counter() - start) * 1000)
+
+        print(f"  {layout:<24} {file_mb:>9.1f} MB on disk")
+        for column in ["gross_sales", "payment_type", "customer_name", "n_fold"]:
+            print(f"  {layout:<24} {column:<20} {compression[column]}")
+        for name, ms in timings.items():
+            result = Result(
+                n_rows,
+                layout,
+                name,
+                file_mb,
+                statistics.median(ms),
+                statistics.quantiles(ms, n=20)[-1],
+            )
+            print(
+                f"  {layout:<24} {name:<20} "
+                f"{result.median_ms:>9.3f} ms {result.p95_ms:>9.3f} ms (p95)"
+            )
+            results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="receipt counts to benchmark",
+    )
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in args.rows:
+        workdir = Path(tempfile.mkdtemp(prefix=f"cleannest-encodings-{n_rows}-"))
+        try:
+            results += run(n_rows, workdir, args.customers, args.repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps([asdict(r) for r in results], indent=2))
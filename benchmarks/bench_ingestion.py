@@ -0,0 +1,190 @@
+"""Benchmark the ingestion pipeline on synthetic POS exports
+
+Every stage runs in a fresh process, so its peak RSS is not inflated by
+earlier stages. Only the stage itself is timed, not its setup.
+
+    uv run benchmarks/bench_ingestion.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "cleannest"))
+
+import ingestion  # noqa: E402
+from pos_export import generate_data_dir  # noqa: E402
+
+
+@dataclass
+class Result:
+    n_rows: int
+    stage: str
+    rows: int
+    seconds: float
+    peak_rss_mb: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process, or of its largest worker process"""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+    # ru_maxrss survives exec, so a spawned process would report its
+    # parent's peak. On Linux, VmHWM is reset by exec.
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                peak = int(line.split()[1]) * 1024
+                break
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    return max(peak, children) / 2**20
+
+
+def _measure(stage, workdir: Path, *args) -> tuple[int, float, float]:
+    os.chdir(workdir)
+    rows, seconds = stage(*args)
+    return rows, seconds, _peak_rss_mb()
+
+
+def _isolated(stage, workdir: Path, *args) -> tuple[int, float, float]:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_measure, stage, workdir, *args).result()
+
+
+# Stages, run with `data/` in the working directory
+
+
+def load_customers() -> tuple[int, float]:
+    start = time.perf_counter()
+    df = ingestion.load_customer_data()
+    return df.height, time.perf_counter() - start
+
+
+def load_receipts(workers: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    receipts_df, items_df = ingestion.load_receipt_data(workers)
+    elapsed = time.perf_counter() - start
+
+    # Keep the output for the write stage
+    receipts_df.write_parquet("receipts.parquet")
+    items_df.write_parquet("receipt_items.parquet")
+    return receipts_df.height, elapsed
+
+
+def write_receipts() -> tuple[int, float]:
+    receipts_df = pl.read_parquet("receipts.parquet")
+    items_df = pl.read_parquet("receipt_items.parquet")
+    Path("main.db").unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    ingestion.df2db(receipts_df, "main.db", "receipts")
+    ingestion.df2db(items_df, "main.db", "receipt_items")
+    return receipts_df.height + items_df.height, time.perf_counter() - start
+
+
+def prepare_sync() -> tuple[int, float]:
+    # Sync every export but the latest, which the sync stage then adds
+    files = sorted(Path("data/receipts").glob("*.csv"))
+    sync_dir = Path("data/receipts_sync")
+    shutil.rmtree(sync_dir, ignore_errors=True)
+    sync_dir.mkdir()
+    for fp in files[:-1]:
+        shutil.copy(fp, sync_dir / fp.name)
+
+    Path("sync.db").unlink(missing_ok=True)
+    ingestion.sync_receipt_data("sync.db", sync_dir)
+    return 0, 0.0
+
+
+def sync_latest_export() -> tuple[int, float]:
+    latest = sorted(Path("data/receipts").glob("*.csv"))[-1]
+    sync_dir = Path("data/receipts_sync")
+    shutil.copy(latest, sync_dir / latest.name)
+
+    start = time.perf_counter()
+    rows = ingestion.sync_receipt_data("sync.db", sync_dir)
+    return rows, time.perf_counter() - start
+
+
+def run(n_rows: int, workdir: Path, workers: int) -> list[Result]:
+    print(f"Generating {n_rows:,} receipts...")
+    generate_data_dir(workdir / "data", n_rows)
+
+    stages = [
+        ("load_customer_data", load_customers, ()),
+        ("load_receipt_data", load_receipts, (1,)),
+    ]
+    if workers > 1:
+        stages.append((f"load_receipt_data ({workers} workers)", load_receipts, (workers,)))
+    stages += [
+        ("df2db receipts + items", write_receipts, ()),
+        ("sync_receipt_data (latest export)", sync_latest_export, ()),
+    ]
+
+    results = []
+    for name, stage, args in stages:
+        if stage is sync_latest_export:
+            _isolated(prepare_sync, workdir)
+
+        rows, seconds, peak_rss_mb = _isolated(stage, workdir, *args)
+        result = Result(n_rows, name, rows, seconds, peak_rss_mb)
+        print(
+            f"  {name:<36} {seconds:>9.3f}s {peak_rss_mb:>9.1f} MB "
+            f"{result.rows_per_sec:>14,.0f} rows/s"
+        )
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="receipt counts to benchmark, up to 10M",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep generated data")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in args.rows:
+        workdir = Path(tempfile.mkdtemp(prefix=f"cleannest-bench-{n_rows}-"))
+        try:
+            results += run(n_rows, workdir, args.workers)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                [asdict(r) | {"rows_per_sec": r.rows_per_sec} for r in results],
+                indent=2,
+            )
+        )
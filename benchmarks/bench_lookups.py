@@ -0,0 +1,163 @@
+"""Benchmark range scans and point lookups on the receipts table
+
+Compares a table in arrival order without indexes, as left by upserts of
+overlapping exports, with the layout written by ingestion: sorted by
+timestamp, with indexes on `receipt_id`, `customer_name` and
+`customers.customer_id`.
+
+    uv run benchmarks/bench_lookups.py --rows 100000 1000000 10000000
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "cleannest"))
+
+import ingestion  # noqa: E402
+from pos_export import generate_receipts  # noqa: E402
+
+
+QUERIES = {
+    "range scan (1 week)": """
+        SELECT count(*), sum(gross_sales) FROM receipts
+        WHERE timestamp >= ? AND timestamp < ?
+    """,
+    "point lookup (receipt_id)": "SELECT * FROM receipts WHERE receipt_id = ?",
+    "customer receipts (customer_name)": """
+        SELECT * FROM receipts WHERE customer_name = ?
+    """,
+    "point lookup (customer_id)": "SELECT * FROM customers WHERE customer_id = ?",
+}
+
+
+@dataclass
+class Result:
+    n_rows: int
+    layout: str
+    query: str
+    median_ms: float
+    p95_ms: float
+
+
+def _receipts(n_rows: int, n_customers: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+    receipts = generate_receipts(n_rows, n_customers=n_customers).select(
+        "timestamp",
+        pl.col("Receipt number").alias("receipt_id"),
+        pl.col("Customer name").alias("customer_name"),
+        pl.col("Gross sales").alias("gross_sales"),
+        pl.col("Description").alias("description"),
+    )
+    customers = pl.DataFrame(
+        {
+            "customer_id": np.arange(n_customers).astype(str),
+            "customer_name": np.char.add("Customer ", np.arange(n_customers).astype(str)),
+        }
+    )
+    return receipts, customers
+
+
+def write_unsorted(con: duckdb.DuckDBPyConnection, receipts, customers) -> None:
+    con.register("_receipts", receipts.to_arrow())
+    con.register("_customers", customers.to_arrow())
+    con.execute("CREATE TABLE receipts AS FROM _receipts ORDER BY random()")
+    con.execute("CREATE TABLE customers AS FROM _customers ORDER BY random()")
+
+
+def write_clustered(con: duckdb.DuckDBPyConnection, receipts, customers) -> None:
+    with ingestion.transaction(con):
+        ingestion.write_table(con, receipts, "receipts")
+        ingestion.write_table(con, customers, "customers")
+
+
+LAYOUTS = {
+    "unsorted, no indexes": write_unsorted,
+    "clustered + indexed": write_clustered,
+}
+
+
+def _params(receipts: pl.DataFrame, n_customers: int, rng) -> dict[str, list]:
+    start = receipts["timestamp"].min()
+    span = (receipts["timestamp"].max() - start).days
+    week = start + timedelta(days=int(rng.integers(0, max(span - 7, 1))))
+    return {
+        "range scan (1 week)": [week, week + timedelta(days=7)],
+        "point lookup (receipt_id)": [receipts["receipt_id"][int(rng.integers(0, receipts.height))]],
+        "customer receipts (customer_name)": [f"Customer {rng.integers(0, n_customers)}"],
+        "point lookup (customer_id)": [str(rng.integers(0, n_customers))],
+    }
+
+
+def run(n_rows: int, workdir: Path, n_customers: int, repeat: int) -> list[Result]:
+    print(f"Generating {n_rows:,} receipts...")
+    receipts, customers = _receipts(n_rows, n_customers)
+
+    results = []
+    for layout, write in LAYOUTS.items():
+        db = workdir / f"{layout.split(',')[0]}.db"
+        with duckdb.connect(db) as con:
+            write(con, receipts, customers)
+            con.execute("CHECKPOINT")
+
+        # Reopen, so that the queries read the persisted layout
+        rng = np.random.default_rng(0)
+        with duckdb.connect(db, read_only=True) as con:
+            timings = {name: [] for name in QUERIES}
+            for _ in range(repeat):
+                for name, params in _params(receipts, n_customers, rng).items():
+                    start = time.perf_counter()
+                    con.execute(QUERIES[name], params).fetchall()
+                    timings[name].append((time.perf_counter() - start) * 1000)
+
+        for name, ms in timings.items():
+            result = Result(
+                n_rows,
+                layout,
+                name,
+                statistics.median(ms),
+                statistics.quantiles(ms, n=20)[-1],
+            )
+            print(
+                f"  {layout:<22} {name:<34} "
+                f"{result.median_ms:>9.3f} ms {result.p95_ms:>9.3f} ms (p95)"
+            )
+            results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="receipt counts to benchmark",
+    )
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in args.rows:
+        workdir = Path(tempfile.mkdtemp(prefix=f"cleannest-lookups-{n_rows}-"))
+        try:
+            results += run(n_rows, workdir, args.customers, args.repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps([asdict(r) for r in results], indent=2))
@@ -0,0 +1,183 @@
+"""Generate synthetic POS exports shaped like the real `data/` directory"""
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+
+RECEIPT_HEADER = [
+    "Date",
+    "Receipt number",
+    "Receipt type",
+    "Gross sales",
+    "Discounts",
+    "Net sales",
+    "Taxes",
+    "Total collected",
+    "Cost of goods",
+    "Gross profit",
+    "Payment type",
+    "Description",
+    "Dining option",
+    "POS",
+    "Store",
+    "Cashier name",
+    "Customer name",
+    "Customer contacts",
+    "Comment",
+    "Status",
+]
+
+# (description, gross sales) of the orders customers usually place
+ORDERS = [
+    ("1 x Wash, 1 x Dry, 1 x Fold, 1 x Ariel Liquid Detergent, 1 x Downy Fabcon", 195.0),
+    ("1 x TITAN Wash, 1 x TITAN Dry, 1 x Fold, 2 x Ariel Liquid Detergent, 2 x Downy Fabcon", 265.0),
+    ("1 x Wash, 1 x Dry, 1 x Fold, 1 x Ariel Liquid Detergent, 1 x Downy Fabcon, 1 x Zonrox Colorsafe Bleach", 201.0),
+    ("2 x Wash, 2 x Dry, 2 x Fold, 2 x Ariel Liquid Detergent, 2 x Downy Fabcon", 390.0),
+    ("1 x Wash, 1 x Ariel Liquid Detergent", 83.0),
+    ("1 x Dry", 65.0),
+    ("1 x Fold", 35.0),
+    ("2 x TITAN Wash, 2 x TITAN Dry, 2 x Fold", 410.0),
+]
+
+
+def generate_receipts(
+    n_rows: int,
+    start: datetime = datetime(2025, 1, 18),
+    n_customers: int = 2_000,
+    cancel_rate: float = 0.02,
+    seed: int = 0,
+) -> pl.DataFrame:
+    """Generate `n_rows` receipts, one every few minutes of opening hours"""
+    rng = np.random.default_rng(seed)
+
+    # Spread receipts over opening hours (7am to 9pm), ~60 receipts a day
+    n_days = max(n_rows // 60, 1)
+    days = rng.integers(0, n_days, n_rows)
+    minutes = rng.integers(7 * 60, 21 * 60, n_rows)
+    timestamps = (
+        pl.Series(days * 24 * 60 + minutes).cast(pl.Int64) * 60_000_000
+    ).cast(pl.Duration("us")) + start
+
+    orders = rng.integers(0, len(ORDERS), n_rows)
+    descriptions = np.array([d for d, _ in ORDERS])[orders]
+    gross_sales = np.array([p for _, p in ORDERS])[orders]
+    discounts = np.where(rng.random(n_rows) < 0.05, 35.0, 0.0)
+
+    return (
+        pl.DataFrame(
+            {
+                "timestamp": timestamps,
+                "Receipt type": "Sale",
+                "Gross sales": gross_sales,
+                "Discounts": discounts,
+                "Net sales": gross_sales - discounts,
+                "Taxes": 0.0,
+                "Total collected": gross_sales - discounts,
+                "Cost of goods": 0.0,
+                "Gross profit": gross_sales - discounts,
+                "Payment type": rng.choice(["Cash", "Gcash", "Card"], n_rows, p=[0.6, 0.35, 0.05]),
+                "Description": descriptions,
+                "Dining option": None,
+                "POS": "POS 1",
+                "Store": "Cleannest",
+                "Cashier name": rng.choice(["Hannah", "Matet"], n_rows),
+                "Customer name": np.char.add(
+                    "Customer ", rng.integers(0, n_customers, n_rows).astype(str)
+                ),
+                "Customer contacts": None,
+                "Comment": None,
+                "Status": np.where(rng.random(n_rows) < cancel_rate, "Cancelled", "Closed"),
+            }
+        )
+        .sort("timestamp")
+        .with_columns(
+            pl.col("timestamp").dt.strftime("%-m/%-d/%y %I:%M %p").alias("Date"),
+            pl.format(
+                "1-{}", pl.int_range(pl.len()).cast(pl.String).str.zfill(8)
+            ).alias("Receipt number"),
+        )
+        .select(RECEIPT_HEADER + ["timestamp"])
+    )
+
+
+def write_receipt_exports(
+    receipts: pl.DataFrame,
+    receipt_dir: Path,
+    duplicate_rate: float = 0.01,
+    seed: int = 0,
+) -> list[Path]:
+    """Write one export per month, repeating a fraction of each month's
+    receipts in the next month's export, like overlapping POS exports"""
+    rng = np.random.default_rng(seed)
+    receipt_dir.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    previous = None
+    for (month,), df in receipts.group_by(
+        pl.col("timestamp").dt.truncate("1mo"), maintain_order=True
+    ):
+        export = df
+        if previous is not None and duplicate_rate > 0:
+            mask = rng.random(previous.height) < duplicate_rate
+            export = pl.concat([previous.filter(pl.Series(mask)), df])
+
+        fp = receipt_dir / f"receipts-{month:%Y-%m}.csv"
+        export.drop("timestamp").write_csv(fp)
+        files.append(fp)
+        previous = df
+
+    return files
+
+
+def write_customer_export(customer_dir: Path, n_customers: int = 2_000) -> Path:
+    customer_dir.mkdir(parents=True, exist_ok=True)
+    fp = customer_dir / "customers.csv"
+
+    ids = np.arange(n_customers)
+    pl.DataFrame(
+        {
+            "Customer ID": ids.astype(str),
+            "Customer name": np.char.add("customer ", ids.astype(str)),
+            "Email": None,
+            "Phone": "09170000000",
+            "Address": None,
+            "City": None,
+            "Province": None,
+            "Postal code": None,
+            "Country": "PH",
+            "Customer code": None,
+            "Points balance": 0,
+            "Note": None,
+            "First visit": None,
+            "Last visit": None,
+            "Total visits": 0,
+            "Total spent": 0.0,
+        }
+    ).write_csv(fp)
+    return fp
+
+
+def generate_data_dir(
+    data_dir: Path, n_rows: int, n_customers: int = 2_000, seed: int = 0
+) -> list[Path]:
+    """Populate `data_dir` with `receipts/` and `customers/` exports"""
+    receipts = generate_receipts(n_rows, n_customers=n_customers, seed=seed)
+    files = write_receipt_exports(receipts, data_dir / "receipts", seed=seed)
+    write_customer_export(data_dir / "customers", n_customers)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--customers", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files = generate_data_dir(args.data_dir, args.rows, args.customers, args.seed)
+    print(f"Wrote {args.rows:,} receipts to {len(files)} exports in {args.data_dir}")
@@ -1,25 +1,844 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Callable, Iterator
 import polars as pl
 import duckdb
 
+from .dayindex import DAY_INDEX_COLUMNS, DayIndex
+from .lake import LAKE_DIR, create_lake_views
+from .models import Order
+from .orders import ORDER_TABLES, OrderWriter
+from .querylog import PROFILE_QUERIES, SLOW_QUERY_MS, calling_page, log_query
+from .snapshot import snapshot_version
+
+
+def _freeze(value):
+    """Make query parameters hashable"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class QueryCache:
+    """Least recently used query results, bounded by their size in memory
+
+    Results are keyed by (normalized SQL, parameters, snapshot version).
+    Values derived from them, such as chart specs, can share the cache.
+    Ingestion bumps the snapshot version, so results of older snapshots
+    are never returned again, and are dropped as soon as a newer version
+    is seen.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.version = None
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str, params: list | None, version: int) -> tuple:
+        return (re.sub(r"\s+", " ", sql).strip(), _freeze(params or []), version)
+
+    @staticmethod
+    def size(value: Any) -> int:
+        if isinstance(value, pl.DataFrame):
+            return value.estimated_size()
+        return len(json.dumps(value, default=str))
+
+    def get(self, key: tuple) -> Any | None:
+        with self._lock:
+            if self.version is None or key[-1] > self.version:
+                self._clear()
+                self.version = key[-1]
+                return None
+            # A straggler reading an older snapshot misses, and leaves the
+            # current version's results alone
+            if key[-1] < self.version:
+                return None
+
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+            return df
+
+    def put(self, key: tuple, df: Any) -> None:
+        size = self.size(df)
+        with self._lock:
+            # Don't let a newer snapshot's results be evicted by a straggler
+            if key[-1] != self.version or size > self.max_bytes:
+                return
+
+            if key in self._entries:
+                self.n_bytes -= self.size(self._entries.pop(key))
+            self._entries[key] = df
+            self.n_bytes += size
+
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.n_bytes -= self.size(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self.n_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ConnectionPool:
+    """A process-wide DuckDB handle shared by every session
+
+    The database is opened once, so every session shares its buffer
+    cache. Each thread reads through its own cursor, and writes go
+    through a single writer cursor, one transaction at a time.
+
+    DuckDB only allows one configuration per database file in a process,
+    so readers and the writer share one instance rather than opening a
+    separate read-only handle.
+    """
+
+    _pools: dict[tuple, "ConnectionPool"] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(
+        self,
+        db: Path,
+        init: Callable[[duckdb.DuckDBPyConnection], None] | None = None,
+    ):
+        self.db = Path(db)
+        self.init = init
+        self.con = duckdb.connect(self.db)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer = None
+
+        # Results are shared by every session reading through this pool
+        cache_mb = int(os.environ.get("CLEANNEST_CACHE_MB", 256))
+        self.cache = QueryCache(cache_mb * 2**20)
+
+        # Prefix sums of the daily summary, see `CleannestDatabase.day_index`
+        self.day_index: DayIndex | None = None
+        self.day_index_lock = threading.Lock()
+
+    @classmethod
+    def get(
+        cls,
+        db: Path,
+        init: Callable[[duckdb.DuckDBPyConnection], None] | None = None,
+    ) -> "ConnectionPool":
+        """Return the pool for `db`, opening it on first use"""
+        key = (Path(db).resolve(), init)
+        with cls._pools_lock:
+            if key not in cls._pools:
+                cls._pools[key] = cls(db, init)
+            return cls._pools[key]
+
+    def _new_cursor(self) -> duckdb.DuckDBPyConnection:
+        cursor = self.con.cursor()
+        if PROFILE_QUERIES:
+            # Keep the profile of the last query, logged if it was slow
+            cursor.execute("SET enable_profiling = 'query_tree'")
+            cursor.execute(f"SET profiling_output = '{_profile_path(cursor)}'")
+        if self.init is not None:
+            self.init(cursor)
+        return cursor
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Return the calling thread's cursor"""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._new_cursor()
+        return cursor
+
+    @contextmanager
+    def writer(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Hold the single writer cursor for one transaction"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._new_cursor()
+
+            self._writer.begin()
+            try:
+                yield self._writer
+            except Exception:
+                self._writer.rollback()
+                raise
+            # A failed commit ends the transaction itself, nothing to roll back
+            self._writer.commit()
+
+
+_FILTER_OPERATORS = ["=", "!=", "<", "<=", ">", ">="]
+
+
+def _profile_path(cursor: duckdb.DuckDBPyConnection) -> Path:
+    # Each cursor overwrites its file with the profile of its last query
+    name = f"cleannest-{os.getpid()}-{id(cursor)}.profile"
+    return Path(tempfile.gettempdir()) / name
+
+
+def _profile(cursor: duckdb.DuckDBPyConnection, duration_ms: float) -> str | None:
+    """The `EXPLAIN ANALYZE` tree of the cursor's last query, if it was slow
+    and queries are profiled, see `PROFILE_QUERIES`"""
+    if not PROFILE_QUERIES or duration_ms < SLOW_QUERY_MS:
+        return None
+    # A missing profile must not fail the query it describes
+    try:
+        return _profile_path(cursor).read_text()
+    except (OSError, ValueError):
+        return None
+
+
+class _InstrumentedRelation:
+    """A relation that times and logs the query when it is materialized"""
+
+    _MATERIALIZE = {
+        "pl",
+        "df",
+        "arrow",
+        "fetch_arrow_table",
+        "fetchall",
+        "fetchone",
+        "fetchdf",
+        "fetchnumpy",
+    }
+
+    def __init__(self, relation, cursor, sql: str, page: str):
+        self._relation = relation
+        self._cursor = cursor
+        self._sql = sql
+        self._page = page
+
+    def __getattr__(self, name):
+        attr = getattr(self._relation, name)
+        if name not in self._MATERIALIZE:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            duration_ms = (time.perf_counter() - start) * 1000
+            log_query(
+                self._sql,
+                None,
+                duration_ms,
+                len(result) if hasattr(result, "__len__") else None,
+                profile=_profile(self._cursor, duration_ms),
+                page=self._page,
+            )
+            return result
+
+        return timed
+
+
+class InstrumentedCursor:
+    """A cursor whose `execute` and `sql` calls are timed and logged,
+    tagged with the calling page, see `querylog`"""
+
+    def __init__(self, cursor: duckdb.DuckDBPyConnection):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql: str, parameters=None) -> "InstrumentedCursor":
+        start = time.perf_counter()
+        self._cursor.execute(sql, parameters)
+        duration_ms = (time.perf_counter() - start) * 1000
+        log_query(
+            sql, parameters, duration_ms, profile=_profile(self._cursor, duration_ms)
+        )
+        return self
+
+    def sql(self, sql: str, **kwargs):
+        page = calling_page()
+        start = time.perf_counter()
+        relation = self._cursor.sql(sql, **kwargs)
+        if relation is None:
+            # Statements that don't return rows run right away
+            duration_ms = (time.perf_counter() - start) * 1000
+            log_query(sql, kwargs.get("params"), duration_ms, page=page)
+            return None
+        return _InstrumentedRelation(relation, self._cursor, sql, page)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _lake_views(con: duckdb.DuckDBPyConnection) -> None:
+    create_lake_views(con, LAKE_DIR)
+
 
 class CleannestDatabase:
-    def __init__(self):
+    def __init__(self, storage: str | None = None):
+        """Connect to the cleannest database
+
+        Instances are cheap, every instance in the process shares one
+        connection pool.
+
+        Parameters
+        ----------
+        storage : Optional[str]
+            "duckdb" to read every table from `main.db`, or "lake" to read
+            receipts, receipt items and expenses from their Parquet
+            partitions. Defaults to the `CLEANNEST_STORAGE` environment
+            variable, or "duckdb" if it is unset.
+        """
         self.db = Path(__file__).parent / "db" / "main.db"
-        self.con = duckdb.connect(self.db)
 
-    def fetch_customers(self) -> pl.DataFrame:
-        query = "SELECT * FROM customers"
-        return self.con.execute(query).pl()
+        self.storage = storage or os.environ.get("CLEANNEST_STORAGE", "duckdb")
+        self.pool = ConnectionPool.get(
+            self.db, _lake_views if self.storage == "lake" else None
+        )
+
+    @property
+    def con(self) -> InstrumentedCursor:
+        """The calling thread's cursor, with its queries logged"""
+        return InstrumentedCursor(self.pool.cursor())
+
+    def writer(self):
+        """Context manager holding the single writer for one transaction"""
+        return self.pool.writer()
+
+    def query(
+        self, sql: str, params: list | None = None, cache: bool = True
+    ) -> pl.DataFrame:
+        """Run a query, or return its result from the cache
+
+        Identical queries are computed once per snapshot version, however
+        many sessions or pages run them. Don't modify the returned
+        dataframe in place, it is shared. Queries of tables written without
+        bumping the snapshot version, e.g. orders, pass `cache=False`.
+
+        Every call is logged with its latency and whether the cache
+        answered it, see `querylog`.
+        """
+        start = time.perf_counter()
+        con = self.pool.cursor()
+        key = QueryCache.key(sql, params, snapshot_version(con)) if cache else None
+        df = self.pool.cache.get(key) if cache else None
+
+        cached = df is not None
+        if not cached:
+            # Money is exact in the database, charts and widgets take floats
+            df = (
+                con.execute(sql, params or [])
+                .pl()
+                .with_columns(pl.col(pl.Decimal).cast(pl.Float64))
+            )
+            if cache:
+                self.pool.cache.put(key, df)
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        log_query(
+            sql,
+            params,
+            duration_ms,
+            df.height,
+            cached,
+            None if cached else _profile(con, duration_ms),
+        )
+        return df
+
+    def cached(self, name: str, params: list, compute: Callable[[], Any]) -> Any:
+        """Memoize a dataframe, or a JSON-like value, derived from the database
+
+        The result shares the query cache, keyed by `name`, `params` and
+        the snapshot version, so it is recomputed once after ingestion.
+        Don't modify the returned value in place, it is shared.
+        """
+        key = QueryCache.key(name, params, snapshot_version(self.pool.cursor()))
+        df = self.pool.cache.get(key)
+        if df is None:
+            df = compute()
+            self.pool.cache.put(key, df)
+        return df
+
+    def _select(
+        self,
+        table: str,
+        columns: list[str] | None = None,
+        where: list[tuple[str, list]] | None = None,
+        order_by: str | None = None,
+        limit: int | None = None,
+        distinct: bool = False,
+        offset: int | None = None,
+        cache: bool = True,
+    ) -> pl.DataFrame:
+        """Compile a projection and predicates into one parameterized query
+
+        Parameters
+        ----------
+        table : str
+            table to select from
+        columns : Optional[list[str]]
+            columns to select, all columns if None
+        where : Optional[list[tuple[str, list]]]
+            (SQL predicate, parameters) pairs, combined with AND
+        order_by : Optional[str]
+            ORDER BY clause
+        limit : Optional[int]
+            maximum number of rows to return
+        distinct : bool
+            whether to drop duplicate rows
+        offset : Optional[int]
+            number of rows to skip
+        cache : bool
+            whether to answer from the query cache, see `query`
+        """
+        projection = "*"
+        if columns:
+            projection = ", ".join(_quote(col) for col in columns)
+
+        query = f"SELECT {'DISTINCT ' if distinct else ''}{projection} FROM {table}"
+        params = []
+        if where:
+            query += " WHERE " + " AND ".join(f"({sql})" for sql, _ in where)
+            params = [param for _, predicate_params in where for param in predicate_params]
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        if offset:
+            query += " OFFSET ?"
+            params.append(offset)
+
+        return self.query(query, params, cache)
+
+    def _is_lake_table(self, table: str) -> bool:
+        """Whether `table` is read from its Parquet partitions"""
+        if self.storage != "lake":
+            return False
+        return bool(
+            self.con.execute(
+                "SELECT 1 FROM duckdb_views() WHERE temporary AND view_name = ?",
+                [table],
+            ).fetchone()
+        )
+
+    def _date_range(
+        self,
+        table: str,
+        col: str,
+        start: date | datetime | None,
+        end: date | datetime | None,
+    ) -> list[tuple[str, list]]:
+        """Predicates for `start <= col < end`
+
+        Lake tables are also filtered on their partition columns, so that
+        DuckDB skips the files of months outside the range.
+        """
+        where = []
+        is_lake = self._is_lake_table(table)
+        if start is not None:
+            where.append((f"{_quote(col)} >= ?", [start]))
+            if is_lake:
+                where.append(
+                    (
+                        "year > ? OR (year = ? AND month >= ?)",
+                        [start.year, start.year, start.month],
+                    )
+                )
+        if end is not None:
+            where.append((f"{_quote(col)} < ?", [end]))
+            if is_lake:
+                where.append(
+                    (
+                        "year < ? OR (year = ? AND month <= ?)",
+                        [end.year, end.year, end.month],
+                    )
+                )
+        return where
+
+    def fetch_customers(
+        self,
+        columns: list[str] | None = None,
+        customers: list[str] | None = None,
+        limit: int | None = None,
+    ) -> pl.DataFrame:
+        """Fetch customers, optionally only those named in `customers`"""
+        where = []
+        if customers:
+            where.append(("customer_name IN (SELECT unnest(?))", [list(customers)]))
+        return self._select("customers", columns, where, limit=limit)
+
+    def fetch_receipts(
+        self,
+        start: date | datetime | None = None,
+        end: date | datetime | None = None,
+        columns: list[str] | None = None,
+        customers: list[str] | None = None,
+        limit: int | None = None,
+        distinct: bool = False,
+    ) -> pl.DataFrame:
+        """Fetch receipts, filtered and projected in the database
+
+        Parameters
+        ----------
+        start : Optional[date | datetime]
+            earliest timestamp to include
+        end : Optional[date | datetime]
+            latest timestamp to include, exclusive
+        columns : Optional[list[str]]
+            columns to fetch, all columns if None
+        customers : Optional[list[str]]
+            only include receipts of these customers
+        limit : Optional[int]
+            maximum number of receipts, latest first when set
+        distinct : bool
+            whether to drop duplicate rows, e.g. to list customer names
+        """
+        where = self._date_range("receipts", "timestamp", start, end)
+        if customers:
+            where.append(("customer_name IN (SELECT unnest(?))", [list(customers)]))
+        order_by = "timestamp DESC" if limit is not None else None
+        return self._select("receipts", columns, where, order_by, limit, distinct)
+
+    def fetch_receipt_date_range(self) -> tuple[datetime | None, datetime | None]:
+        """Timestamps of the earliest and latest receipts"""
+        return self.query("SELECT min(timestamp), max(timestamp) FROM receipts").row(0)
+
+    def submit_order(self, order: Order) -> Future:
+        """Queue an order to be written to `orders` and `order_items`
+
+        Orders are committed in batches by a background writer, see
+        `orders.OrderWriter`. Wait on the returned future for the order's
+        id once it is written.
+        """
+        return OrderWriter.get(self.pool).submit(order)
+
+    def fetch_orders(
+        self,
+        start: date | datetime | None = None,
+        end: date | datetime | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Fetch orders within `start <= timestamp < end`, latest first
+
+        Order writes don't bump the snapshot version, so orders are always
+        read from the database.
+        """
+        if "orders" not in self.list_tables():
+            return pl.DataFrame()
+        where = self._date_range("orders", "timestamp", start, end)
+        return self._select(
+            "orders", columns, where, order_by="timestamp DESC", cache=False
+        )
+
+    def fetch_expenses(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        columns: list[str] | None = None,
+        limit: int | None = None,
+    ) -> pl.DataFrame:
+        """Fetch expenses with an item name, optionally within `start <=
+        date < end`"""
+        where = [("item_name IS NOT NULL", [])]
+        where += self._date_range("expenses", "date", start, end)
+        return self._select("expenses", columns, where, limit=limit)
+
+    def fetch_items(
+        self, columns: list[str] | None = None, limit: int | None = None
+    ) -> pl.DataFrame:
+        return self._select("items", columns, limit=limit)
+
+    def fetch_daily_summary(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Fetch the daily receipt totals within `start <= date < end`"""
+        where = self._date_range("daily_summary", "date", start, end)
+        return self._select("daily_summary", columns, where, order_by="date")
+
+    def fetch_monthly_summary(self, columns: list[str] | None = None) -> pl.DataFrame:
+        return self._select("monthly_summary", columns, order_by="month_start")
+
+    def fetch_hourly_weekday_summary(
+        self, columns: list[str] | None = None
+    ) -> pl.DataFrame:
+        return self._select(
+            "hourly_weekday_summary", columns, order_by="weekday, hour"
+        )
+
+    def fetch_customer_summary(
+        self,
+        columns: list[str] | None = None,
+        customers: list[str] | None = None,
+    ) -> pl.DataFrame:
+        where = []
+        if customers:
+            where.append(("customer_name IN (SELECT unnest(?))", [list(customers)]))
+        return self._select("customer_summary", columns, where)
+
+    def fetch_kpis(
+        self, start: date | None = None, end: date | None = None
+    ) -> dict[str, float | int | None]:
+        """Evaluate every headline metric in one query
+
+        Daily metrics cover `start <= date < end`, and "today" is the
+        latest day in that window. Customer counts cover all receipts.
+        The result is cached per snapshot version like any other query.
+
+        Returns
+        -------
+        dict[str, float | int | None]
+            total_revenue, daily_average_revenue, total_revenue_today,
+            total_load_count, daily_average_load_count,
+            total_load_count_today, total_customer_count and
+            total_returning_customer_count
+        """
+        where = self._date_range("daily_summary", "date", start, end)
+        predicate = " AND ".join(f"({sql})" for sql, _ in where) or "true"
+        params = [param for _, predicate_params in where for param in predicate_params]
+
+        query = f"""
+            WITH daily AS (
+                SELECT date, total_gross, load_count,
+                    date = max(date) OVER () AS is_latest
+                FROM daily_summary
+                WHERE {predicate}
+            )
+            SELECT
+                sum(total_gross) AS total_revenue,
+                avg(total_gross) AS daily_average_revenue,
+                sum(total_gross) FILTER (is_latest) AS total_revenue_today,
+                sum(load_count)::BIGINT AS total_load_count,
+                avg(load_count) AS daily_average_load_count,
+                sum(load_count) FILTER (is_latest)::BIGINT AS total_load_count_today,
+                (
+                    SELECT count(DISTINCT customer_name) FROM customers
+                ) AS total_customer_count,
+                (
+                    SELECT count(*) FROM customer_summary
+                    WHERE n_service_transactions > 1
+                ) AS total_returning_customer_count
+            FROM daily
+        """
+        return self.query(query, params).row(0, named=True)
+
+    def day_index(self) -> DayIndex:
+        """Prefix sums of the daily summary at the current snapshot version
+
+        Days added since the index was built are appended to it. It is
+        only rebuilt when days that were already indexed changed, e.g.
+        after a correction or a full sync.
+        """
+        version = snapshot_version(self.pool.cursor())
+        with self.pool.day_index_lock:
+            index = self.pool.day_index
+            if index is not None and index.version == version:
+                return index
+
+            if index is not None and index.last_day_key is not None:
+                sums = ", ".join(f"sum({col}) AS {col}" for col in DAY_INDEX_COLUMNS)
+                indexed = self.query(
+                    f"SELECT count(*) AS n_days, {sums} FROM daily_summary "
+                    "WHERE day_key <= ?",
+                    [index.last_day_key],
+                ).row(0, named=True)
+                if index.matches(indexed):
+                    new_days = self._select(
+                        "daily_summary",
+                        ["day_key", *DAY_INDEX_COLUMNS],
+                        [("day_key > ?", [index.last_day_key])],
+                    )
+                    self.pool.day_index = index.extended(new_days, version)
+                    return self.pool.day_index
+
+            daily = self._select("daily_summary", ["day_key", *DAY_INDEX_COLUMNS])
+            self.pool.day_index = DayIndex(daily, version)
+            return self.pool.day_index
+
+    def fetch_dim_date(
+        self,
+        start: date | None = None,
+        end: date | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        where = []
+        if start is not None:
+            where.append(("date >= ?", [start]))
+        if end is not None:
+            where.append(("date < ?", [end]))
+        return self._select("dim_date", columns, where)
+
+    # Database explorer
+
+    def list_tables(self) -> list[str]:
+        """Names of the tables, a lake view is listed once with the table
+        it shadows"""
+        names = [res[0] for res in self.con.execute("SHOW TABLES").fetchall()]
+        return list(dict.fromkeys(names))
+
+    def _cacheable(self, table: str) -> bool:
+        # Order writes don't bump the snapshot version, see `write_orders`
+        return table not in ORDER_TABLES
+
+    def _check_table(self, table: str) -> str:
+        if table not in self.list_tables():
+            raise ValueError(f"unknown table: {table}")
+        return _quote(table)
+
+    def fetch_table_columns(self, table: str) -> pl.DataFrame:
+        """Name, type and nullability of the columns of a table or view"""
+        self._check_table(table)
+        return self.query(
+            """
+            SELECT column_name, data_type, is_nullable
+            FROM duckdb_columns()
+            WHERE table_name = ?
+            -- A lake view shadows the table of the same name
+            QUALIFY dense_rank() OVER (ORDER BY database_name = 'temp' DESC) = 1
+            ORDER BY column_index
+            """,
+            [table],
+        )
+
+    def estimated_row_count(self, table: str) -> int | None:
+        """Row count from the table's metadata, without scanning it
+
+        Deleted rows may still be counted, page through `count_rows`
+        instead. Returns None for views.
+        """
+        self._check_table(table)
+        df = self.query(
+            """
+            SELECT estimated_size FROM duckdb_tables()
+            WHERE table_name = ? AND NOT temporary
+            """,
+            [table],
+            self._cacheable(table),
+        )
+        if df.is_empty() or self._is_lake_table(table):
+            return None
+        return df.item()
+
+    def fetch_column_stats(
+        self, table: str, sample: int | None = None
+    ) -> pl.DataFrame:
+        """Summary statistics of every column, see DuckDB's `SUMMARIZE`
+
+        Parameters
+        ----------
+        table : str
+            table to summarize
+        sample : Optional[int]
+            summarize a sample of this many rows rather than the table
+        """
+        source = self._check_table(table)
+        if sample is not None:
+            source = f"(FROM {source} USING SAMPLE {int(sample)} ROWS)"
+        return self.query(f"SUMMARIZE {source}", cache=self._cacheable(table))
+
+    def _filter_predicates(
+        self, table: str, filters: list[tuple[str, str, str]] | None
+    ) -> list[tuple[str, list]]:
+        """Compile (column, operator, value) filters into predicates
+
+        Values are cast to the column's type, and "contains" matches the
+        value anywhere in the column's text, ignoring case.
+        """
+        columns = self.fetch_table_columns(table)
+        types = dict(zip(columns["column_name"], columns["data_type"]))
+
+        where = []
+        for column, op, value in filters or []:
+            if column not in types:
+                raise ValueError(f"unknown column: {column}")
+            if op == "contains":
+                where.append((f"{_quote(column)}::VARCHAR ILIKE ?", [f"%{value}%"]))
+            elif op in _FILTER_OPERATORS:
+                where.append(
+                    (f"{_quote(column)} {op} CAST(? AS {types[column]})", [value])
+                )
+            else:
+                raise ValueError(f"unknown operator: {op}")
+        return where
+
+    def count_rows(
+        self, table: str, filters: list[tuple[str, str, str]] | None = None
+    ) -> int:
+        """Number of rows of a table that match every filter"""
+        query = f"SELECT count(*) FROM {self._check_table(table)}"
+        where = self._filter_predicates(table, filters)
+        if where:
+            query += " WHERE " + " AND ".join(f"({sql})" for sql, _ in where)
+        params = [param for _, predicate_params in where for param in predicate_params]
+        return self.query(query, params, self._cacheable(table)).item()
+
+    def fetch_page(
+        self,
+        table: str,
+        page: int = 0,
+        page_size: int = 100,
+        order_by: str | None = None,
+        descending: bool = False,
+        filters: list[tuple[str, str, str]] | None = None,
+    ) -> pl.DataFrame:
+        """Fetch one page of a table, sorted and filtered in the database
+
+        Parameters
+        ----------
+        table : str
+            table to page through
+        page : int
+            zero-based page number
+        page_size : int
+            number of rows per page
+        order_by : Optional[str]
+            column to sort by, in table order if None
+        descending : bool
+            whether to sort in descending order
+        filters : Optional[list[tuple[str, str, str]]]
+            (column, operator, value) filters, combined with AND. Operators
+            are =, !=, <, <=, >, >= and "contains"
+        """
+        source = self._check_table(table)
+        where = self._filter_predicates(table, filters)
+
+        sort = None
+        if order_by is not None:
+            if order_by not in self.fetch_table_columns(table)["column_name"]:
+                raise ValueError(f"unknown column: {order_by}")
+            sort = f"{_quote(order_by)} {'DESC' if descending else 'ASC'} NULLS LAST"
 
-    def fetch_receipts(self):
-        query = "SELECT * FROM receipts"
-        return self.con.execute(query).pl()
+        return self._select(
+            source,
+            where=where,
+            order_by=sort,
+            limit=page_size,
+            offset=page * page_size,
+            cache=self._cacheable(table),
+        )
 
-    def fetch_expenses(self):
-        query = "SELECT * FROM expenses WHERE item_name IS NOT NULL"
-        return self.con.execute(query).pl()
+    def fetch_sample(self, table: str, n_rows: int = 1_000) -> pl.DataFrame:
+        """A random sample of a table
 
-    def fetch_items(self):
-        query = "SELECT * FROM items"
-        return self.con.execute(query).pl()
\ No newline at end of file
+        The reservoir keeps at most `n_rows` rows in memory, however large
+        the table is.
+        """
+        source = self._check_table(table)
+        return self.query(
+            f"FROM {source} USING SAMPLE {int(n_rows)} ROWS",
+            cache=self._cacheable(table),
+        )
@@ -0,0 +1,83 @@
+from datetime import date
+import polars as pl
+
+
+def day_key(col: str | pl.Expr) -> pl.Expr:
+    """Integer key of a date or datetime column, e.g. 20250118"""
+    col = pl.col(col) if isinstance(col, str) else col
+    return (
+        col.dt.year() * 10_000 + col.dt.month().cast(pl.Int32) * 100 + col.dt.day()
+    ).cast(pl.Int32)
+
+
+def build_dim_date(
+    start: date, end: date, holidays: pl.DataFrame | None = None
+) -> pl.DataFrame:
+    """Build a date dimension with one row per day
+
+    Parameters
+    ----------
+    start : date
+        the dimension starts on January 1 of this date's year
+    end : date
+        the dimension ends on December 31 of this date's year
+    holidays : Optional[pl.DataFrame]
+        holidays with a `date` and a `name` column
+
+    Columns
+    -------
+    day_key : int
+        the date as a YYYYMMDD integer, joins with `receipts.day_key`
+    weekday : int
+        ISO weekday, from 1 (Monday) to 7 (Sunday)
+    month_start : date
+        first day of the month
+    month_index : int
+        months since year 0, subtract two to get the months between them
+    is_payday : bool
+        whether the date is the 15th or the last day of the month
+    """
+    dates = pl.date_range(
+        date(start.year, 1, 1), date(end.year, 12, 31), "1d", eager=True
+    )
+
+    dim_date = (
+        pl.DataFrame({"date": dates})
+        .with_columns(
+            day_key("date").alias("day_key"),
+            pl.col("date").dt.year().alias("year"),
+            pl.col("date").dt.month().alias("month"),
+            pl.col("date").dt.day().alias("day"),
+            pl.col("date").dt.weekday().alias("weekday"),
+            pl.col("date").dt.strftime("%A").alias("weekday_name"),
+            pl.col("date").dt.iso_year().alias("iso_year"),
+            pl.col("date").dt.week().alias("iso_week"),
+            pl.col("date").dt.month_start().alias("month_start"),
+            (pl.col("date").dt.year() * 12 + pl.col("date").dt.month() - 1)
+            .cast(pl.Int32)
+            .alias("month_index"),
+            (pl.col("date").dt.weekday() >= 6).alias("is_weekend"),
+            (pl.col("date").dt.day() == 15).alias("is_mid_month_payday"),
+            (pl.col("date") == pl.col("date").dt.month_end()).alias(
+                "is_end_month_payday"
+            ),
+        )
+        .with_columns(
+            (pl.col("is_mid_month_payday") | pl.col("is_end_month_payday")).alias(
+                "is_payday"
+            ),
+        )
+    )
+
+    if holidays is None:
+        holidays = pl.DataFrame(schema={"date": pl.Date, "name": pl.String})
+
+    holiday_names = holidays.group_by(pl.col("date").cast(pl.Date)).agg(
+        pl.col("name").str.join(", ").alias("holiday_name")
+    )
+
+    return (
+        dim_date.join(holiday_names, on="date", how="left")
+        .with_columns(pl.col("holiday_name").is_not_null().alias("is_holiday"))
+        .sort("date")
+    )
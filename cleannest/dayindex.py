@@ -0,0 +1,127 @@
+import copy
+from datetime import date
+
+import numpy as np
+import polars as pl
+
+
+# Daily summary columns with prefix sums. Revenue is summed in centavos,
+# so range totals are exact.
+DAY_INDEX_COLUMNS = [
+    "total_gross",
+    "n_receipts",
+    "load_count",
+    "full_loads",
+    "titan_runs",
+    "n_detergent",
+    "n_fabcon",
+    "n_bleach",
+]
+
+_CENTAVOS = {"total_gross"}
+
+
+def _day_key(d: date) -> int:
+    return d.year * 10_000 + d.month * 100 + d.day
+
+
+class DayIndex:
+    """Prefix sums of the daily summary, for constant time range metrics
+
+    `cumsum[col][i]` is the total of `col` over the first `i` days with
+    receipts. The totals over `start <= date < end` are the difference of
+    two prefix sums, found by binary search over the sorted day keys, so
+    their cost doesn't depend on the length of the history.
+    """
+
+    def __init__(self, daily: pl.DataFrame, version: int = 0):
+        """Build the index from `daily_summary` rows
+
+        Parameters
+        ----------
+        daily : pl.DataFrame
+            rows of `daily_summary`, with `day_key` and `DAY_INDEX_COLUMNS`
+        version : int
+            snapshot version of the rows
+        """
+        daily = daily.sort("day_key")
+        self.version = version
+        self.day_keys = daily["day_key"].to_numpy().astype(np.int32)
+        self.cumsum = {
+            col: np.concatenate([[0], np.cumsum(self._values(daily, col))])
+            for col in DAY_INDEX_COLUMNS
+        }
+
+    @staticmethod
+    def _values(daily: pl.DataFrame, col: str) -> np.ndarray:
+        values = daily[col].fill_null(0).to_numpy()
+        if col in _CENTAVOS:
+            return np.rint(values.astype(np.float64) * 100).astype(np.int64)
+        return values.astype(np.int64)
+
+    @property
+    def last_day_key(self) -> int | None:
+        return int(self.day_keys[-1]) if len(self.day_keys) else None
+
+    def extended(self, daily: pl.DataFrame, version: int) -> "DayIndex":
+        """A copy of the index with days later than every indexed day
+        appended, readers of this index are left undisturbed"""
+        daily = daily.sort("day_key")
+        if self.last_day_key is not None and daily.height > 0:
+            if daily["day_key"].min() <= self.last_day_key:
+                raise ValueError("can only extend the index with later days")
+
+        index = copy.copy(self)
+        index.version = version
+        index.day_keys = np.concatenate(
+            [self.day_keys, daily["day_key"].to_numpy().astype(np.int32)]
+        )
+        index.cumsum = {
+            col: np.concatenate(
+                [cumsum, cumsum[-1] + np.cumsum(self._values(daily, col))]
+            )
+            for col, cumsum in self.cumsum.items()
+        }
+        return index
+
+    def matches(self, totals: dict[str, float | int | None]) -> bool:
+        """Whether the index agrees with totals of every indexed day"""
+        if totals["n_days"] != len(self.day_keys):
+            return False
+        for col in DAY_INDEX_COLUMNS:
+            value = totals[col] or 0
+            if col in _CENTAVOS:
+                value = round(value * 100)
+            if value != self.cumsum[col][-1]:
+                return False
+        return True
+
+    def _bounds(self, start: date | None, end: date | None) -> tuple[int, int]:
+        lo = 0 if start is None else np.searchsorted(self.day_keys, _day_key(start))
+        hi = (
+            len(self.day_keys)
+            if end is None
+            else np.searchsorted(self.day_keys, _day_key(end))
+        )
+        return int(lo), int(max(hi, lo))
+
+    def totals(
+        self, start: date | None = None, end: date | None = None
+    ) -> dict[str, float | int]:
+        """Totals of `DAY_INDEX_COLUMNS` over `start <= date < end`, along
+        with `n_days`, the number of days with receipts"""
+        lo, hi = self._bounds(start, end)
+        totals = {"n_days": hi - lo}
+        for col in DAY_INDEX_COLUMNS:
+            total = int(self.cumsum[col][hi] - self.cumsum[col][lo])
+            totals[col] = total / 100 if col in _CENTAVOS else total
+        return totals
+
+    def means(
+        self, start: date | None = None, end: date | None = None
+    ) -> dict[str, float | None]:
+        """Daily means of `DAY_INDEX_COLUMNS` over `start <= date < end`,
+        across the days with receipts"""
+        totals = self.totals(start, end)
+        n_days = totals.pop("n_days")
+        return {col: total / n_days if n_days else None for col, total in totals.items()}
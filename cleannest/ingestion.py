@@ -1,35 +1,75 @@
+import argparse
+import hashlib
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
 from pathlib import Path
+from typing import Iterator, Literal
 
 import polars as pl
+import pyarrow as pa
 import duckdb
 
+from dates import build_dim_date, day_key
+from items import parse_items
+from lake import export_lake
 from models import Item
+from rollups import (
+    SUMMARY_TABLES,
+    build_summaries,
+    check_summaries,
+    maintain_summaries,
+    summaries_exist,
+)
+from sheets import GoogleSheetSource, LocalSheetSource, SheetSource, fetch_sheets
+from snapshot import bump_snapshot_version
 
 
-def _load_customers_from_csv(fp: Path) -> pl.DataFrame:
-    _colnames = [
-        "customer_id",
-        "customer_name",
-        "email",
-        "phone",
-        "address",
-        "city",
-        "province",
-        "postal_code",
-        "country",
-        "customer_code",
-        "points_balance",
-        "note",
-        "first_visit",
-        "last_visit",
-        "total_visits",
-        "total_spent",
-    ]
+_CUSTOMER_COLUMNS = [
+    "customer_id",
+    "customer_name",
+    "email",
+    "phone",
+    "address",
+    "city",
+    "province",
+    "postal_code",
+    "country",
+    "customer_code",
+    "points_balance",
+    "note",
+    "first_visit",
+    "last_visit",
+    "total_visits",
+    "total_spent",
+]
+
+# POS export header -> column name, for the columns we keep
+_RECEIPT_COLUMNS = {
+    "Date": "timestamp",
+    "Receipt number": "receipt_id",
+    "Receipt type": "receipt_type",
+    "Gross sales": "gross_sales",
+    "Discounts": "discounts",
+    "Total collected": "total_collected",
+    "Payment type": "payment_type",
+    "Description": "description",
+    "Cashier name": "cashier_name",
+    "Customer name": "customer_name",
+    "Status": "status",
+}
 
-    customers_df = pl.read_csv(fp, has_header=True)
-    customers_df.columns = _colnames
-        
-    return customers_df
+
+def _scan_customers(source: Path | str | list[Path]) -> pl.LazyFrame:
+    # Exports are read as strings so that every file shares one schema
+    return pl.scan_csv(
+        source,
+        has_header=True,
+        new_columns=_CUSTOMER_COLUMNS,
+        infer_schema=False,
+    )
 
 
 def load_customer_data() -> pl.DataFrame:
@@ -49,120 +89,109 @@ def load_customer_data() -> pl.DataFrame:
         delivery address of the customer
     """
     customer_data_dir = Path("data/customers")
+    subset = ["customer_id", "customer_name", "email", "phone", "address"]
 
-    _colnames = [
-        "customer_id",
-        "customer_name",
-        "email",
-        "phone",
-        "address",
-        "city",
-        "province",
-        "postal_code",
-        "country",
-        "customer_code",
-        "points_balance",
-        "note",
-        "first_visit",
-        "last_visit",
-        "total_visits",
-        "total_spent",
-    ]
-
-    customers_dfs = []
-    for csv in customer_data_dir.glob("*.csv"):
-        customers_dfs.append(
-            _load_customers_from_csv(csv)
+    return (
+        _scan_customers(customer_data_dir / "*.csv")
+        .select(subset)
+        .with_columns(
+            # Standardize input formats
+            pl.col("customer_name").str.to_titlecase(),
         )
+        .unique(subset=pl.col("customer_id"))
+        .collect(engine="streaming")
+    )
 
-    customers_df = pl.concat(customers_dfs)
-    subset = ["customer_id", "customer_name", "email", "phone", "address"]
 
-    # Set column datatypes
-    customers_df = customers_df.select(subset).with_columns(
-        pl.col("customer_id").cast(pl.String),
-        pl.col("phone").cast(pl.String),
-        # # Standardize input formats
-        pl.col("customer_name").str.to_titlecase(),
-    ).unique(subset=pl.col("customer_id"))
-
-    return customers_df
-
-
-def _load_receipts_from_csv(fp: Path) -> pl.DataFrame:
-    _colnames = [
-        "Date",
-        "Receipt number",
-        "Receipt type",
-        "Gross sales",
-        "Discounts",
-        "Total collected",
-        "Payment type",
-        "Description",
-        "Cashier name",
-        "Customer name",
-        "Status",
-    ]
-    df = pl.read_csv(fp, has_header=True, columns=_colnames)
-    df.columns = [
-        "timestamp",
-        "receipt_id",
-        "receipt_type",
-        "gross_sales",
-        "discounts",
-        "total_collected",
-        "payment_type",
-        "description",
-        "cashier_name",
-        "customer_name",
-        "status",
-    ]
+# Money is stored exactly, in centavos
+MONEY = pl.Decimal(10, 2)
 
-    df = (
-        df.filter(pl.col("status") != "Cancelled")
-        .with_columns(
-            pl.col("timestamp").str.to_datetime(format="%-m/%-d/%y %I:%-M %p"),
+
+def _scan_receipts(source: Path | str | list[Path]) -> pl.LazyFrame:
+    schema = {header: pl.String for header in _RECEIPT_COLUMNS}
+    for header in ["Gross sales", "Discounts", "Total collected"]:
+        schema[header] = MONEY
+
+    # Only the columns in `_RECEIPT_COLUMNS` are read from disk
+    return (
+        pl.scan_csv(source, has_header=True, schema_overrides=schema)
+        .select(list(_RECEIPT_COLUMNS))
+        .rename(_RECEIPT_COLUMNS)
+    )
+
+
+# Bump whenever the parsed output changes, to invalidate the parse cache
+PARSER_VERSION = 5
+
+RECEIPT_CACHE_DIR = Path("data/cache/receipts")
+
+
+def _parse_receipts(lf: pl.LazyFrame) -> pl.LazyFrame:
+    # Cancelled receipts are kept, so that a cancellation in a later export
+    # overrides the sale, see `_split_cancelled`
+    return (
+        lf.with_columns(
+            pl.col("timestamp").str.to_datetime(format="%-m/%-d/%y %I:%-M %p"),
             pl.col("receipt_type").cast(pl.Categorical),
             pl.col("payment_type").cast(pl.Enum(["Cash", "Gcash", "Card"])),
             pl.col("cashier_name").cast(pl.Enum(["Hannah", "Matet"])),
             pl.col("status").cast(pl.Categorical),
         )
         .with_columns(
-            # parse order items
-            pl.col("description")
-            .str.extract(r"(\d) x (TITAN )?Wash")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_wash"),
-            pl.col("description")
-            .str.extract(r"(\d) x (TITAN )?Dry")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_dry"),
-            pl.col("description")
-            .str.extract(r"(\d) x Fold")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_fold"),
-            pl.col("description")
-            .str.extract(r"(\d) x Ariel Liquid Detergent")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_detergent"),
-            pl.col("description")
-            .str.extract(r"(\d) x Downy Fabcon")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_fabcon"),
-            pl.col("description")
-            .str.extract(r"(\d) x Zonrox Colorsafe Bleach")
-            .fill_null(0)
-            .cast(pl.Int8)
-            .alias("n_bleach"),
+            day_key("timestamp").alias("day_key"),
+        )
+        # later exports take precedence over earlier ones
+        .unique(pl.col("receipt_id"), keep="last", maintain_order=True)
+    )
+
+
+def _parse_receipt_items(receipts: pl.LazyFrame) -> pl.LazyFrame:
+    """Split each receipt description into one row per line item, see
+    `items.parse_items`"""
+    return parse_items(receipts, "receipt_id")
+
+
+# (item, variants) of the line items counted by each count column. Only
+# these products count, e.g. a Hand Wash isn't a wash and an Extra TITAN
+# Dry isn't a dry.
+ITEM_COUNTS = {
+    "n_wash": ("wash", [None, "TITAN"]),
+    "n_dry": ("dry", [None, "TITAN"]),
+    "n_fold": ("fold", [None]),
+    "n_detergent": ("detergent", ["Ariel Liquid"]),
+    "n_fabcon": ("fabcon", ["Downy"]),
+    "n_bleach": ("bleach", ["Zonrox Colorsafe"]),
+}
+
+
+def _with_item_counts(receipts: pl.LazyFrame, items: pl.LazyFrame) -> pl.LazyFrame:
+    """Derive the per-receipt item counts and flags from `receipt_items`"""
+
+    def n_items(name: str, item: str, variants: list[str | None]) -> pl.Expr:
+        variant = pl.col("variant").is_in([v for v in variants if v is not None])
+        if None in variants:
+            variant = variant | pl.col("variant").is_null()
+        return (
+            pl.col("quantity")
+            .filter((pl.col("item") == item) & variant)
+            .sum()
+            .alias(name)
+        )
+
+    counts = items.group_by("receipt_id").agg(
+        *[n_items(name, *product) for name, product in ITEM_COUNTS.items()],
+        pl.col("variant").str.contains("TITAN").any().alias("is_titan"),
+    )
+    count_cols = list(ITEM_COUNTS)
+
+    return (
+        receipts.join(counts, on="receipt_id", how="left", maintain_order="left")
+        .with_columns(
+            pl.col(count_cols).fill_null(0),
+            pl.col("is_titan").fill_null(False),
         )
         .with_columns(
             # create additional features
-            pl.col("description").str.contains(r".*TITAN.*").alias("is_titan"),
             pl.when(
                 pl.col("n_wash") > 0,
                 pl.col("n_dry") > 0,
@@ -186,132 +215,773 @@ def _load_receipts_from_csv(fp: Path) -> pl.DataFrame:
         )
     )
 
-    return df
 
+def _load_receipts(
+    source: Path | str | list[Path], drop_cancelled: bool = False
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    receipts = _parse_receipts(_scan_receipts(source))
+    if drop_cancelled:
+        # Filtered and sorted in the plan, before anything is collected
+        receipts = receipts.filter(pl.col("status") != "Cancelled").sort(
+            "timestamp", descending=True
+        )
+    items = _parse_receipt_items(receipts)
 
-def load_receipt_data():
-    receipt_dir = Path("data/receipts")
-    df_list = []
-    for fp in receipt_dir.glob("*.csv"):
-        df_list.append(_load_receipts_from_csv(fp))
+    # Both plans share the scan and parse, which is evaluated once
+    receipts_df, items_df = pl.collect_all(
+        [_with_item_counts(receipts, items), items],
+        engine="streaming",
+    )
+    return receipts_df, items_df
+
+
+def _load_receipts_from_csv(fp: Path) -> tuple[pl.DataFrame, pl.DataFrame]:
+    return _load_receipts(fp)
+
+
+def _parse_receipt_file(fp: Path) -> tuple[pa.Table, pa.Table]:
+    # Runs in a worker process, Arrow tables are cheap to send back
+    receipts_df, items_df = _load_receipts_from_csv(fp)
+    return receipts_df.to_arrow(), items_df.to_arrow()
+
+
+def _parse_receipt_files(
+    files: list[Path], workers: int = 1
+) -> list[tuple[pl.DataFrame, pl.DataFrame]]:
+    """Parse each file separately, in a process pool if `workers > 1`
+
+    Falls back to parsing in this process if the worker pool fails.
+    """
+    if workers > 1 and len(files) > 1:
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(files)), mp_context=ctx
+            ) as pool:
+                return [
+                    (pl.from_arrow(receipts), pl.from_arrow(items))
+                    for receipts, items in pool.map(_parse_receipt_file, files)
+                ]
+        except BrokenProcessPool:
+            print("Worker pool failed, falling back to serial parsing...")
+
+    return [_load_receipts_from_csv(fp) for fp in files]
+
+
+def _merge_receipt_files(
+    results: list[tuple[pl.DataFrame, pl.DataFrame]],
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Merge per-file results in order, so a receipt that appears in more
+    than one export keeps the row from the last file."""
+    receipts_df = pl.concat(
+        [
+            receipts.with_columns(pl.lit(i).alias("_file"))
+            for i, (receipts, _) in enumerate(results)
+        ]
+    ).unique(pl.col("receipt_id"), keep="last", maintain_order=True)
+    items_df = pl.concat(
+        [
+            items.with_columns(pl.lit(i).alias("_file"))
+            for i, (_, items) in enumerate(results)
+        ]
+    ).join(
+        receipts_df.select("receipt_id", "_file"),
+        on=["receipt_id", "_file"],
+        how="semi",
+    )
+
+    return receipts_df.drop("_file"), items_df.drop("_file")
+
+
+def _cache_paths(cache_dir: Path, content_hash: str) -> tuple[Path, Path]:
+    key = f"{content_hash}-v{PARSER_VERSION}"
+    return (
+        cache_dir / f"{key}.receipts.parquet",
+        cache_dir / f"{key}.items.parquet",
+    )
 
+
+def _write_parquet(df: pl.DataFrame, fp: Path) -> None:
+    # Write then rename, so an interrupted sync never leaves a partial file
+    tmp = fp.with_suffix(".tmp")
+    df.write_parquet(tmp)
+    tmp.replace(fp)
+
+
+def _load_cached_receipt_files(
+    files: list[Path], cache_dir: Path, workers: int = 1
+) -> list[tuple[pl.DataFrame, pl.DataFrame]]:
+    """Load parsed receipts from the Parquet cache, parsing only the files
+    whose content or parser version is not cached yet."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    paths = [_cache_paths(cache_dir, _hash_file(fp)) for fp in files]
+
+    misses = [
+        i
+        for i, (receipts_fp, items_fp) in enumerate(paths)
+        if not (receipts_fp.exists() and items_fp.exists())
+    ]
+    if misses:
+        print(f"Parsing {len(misses)} of {len(files)} receipt exports...")
+        parsed = _parse_receipt_files([files[i] for i in misses], workers)
+        for i, (receipts_df, items_df) in zip(misses, parsed):
+            _write_parquet(receipts_df, paths[i][0])
+            _write_parquet(items_df, paths[i][1])
+
+    return [
+        (pl.read_parquet(receipts_fp), pl.read_parquet(items_fp))
+        for receipts_fp, items_fp in paths
+    ]
+
+
+def _load_receipt_files(
+    files: list[Path], workers: int = 1, cache_dir: Path | None = None
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Load receipt exports, fanning out to a process pool if `workers > 1`
+
+    With a `cache_dir`, parsed files are read from and written to the
+    Parquet cache. Otherwise, when running serially or with a single
+    file, all files are loaded through one lazy scan.
+    """
+    files = sorted(files)
+    if cache_dir is not None:
+        return _merge_receipt_files(
+            _load_cached_receipt_files(files, cache_dir, workers)
+        )
+
+    if workers > 1 and len(files) > 1:
+        return _merge_receipt_files(_parse_receipt_files(files, workers))
+
+    return _load_receipts(files)
+
+
+def _split_cancelled(
+    receipts_df: pl.DataFrame, items_df: pl.DataFrame
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.Series]:
+    """Separate cancelled receipts from parsed exports
+
+    Returns
+    -------
+    receipts : pl.DataFrame
+        receipts that were not cancelled
+    receipt_items : pl.DataFrame
+        line items of these receipts
+    cancelled : pl.Series
+        `receipt_id`s of the cancelled receipts
+    """
+    is_cancelled = pl.col("status") == "Cancelled"
+    cancelled = receipts_df.filter(is_cancelled)["receipt_id"]
     return (
-        pl.concat(df_list)
-        .unique(pl.col("receipt_id"))
-        .sort("timestamp", descending=True)   
+        receipts_df.filter(~is_cancelled),
+        items_df.filter(~pl.col("receipt_id").is_in(cancelled.implode())),
+        cancelled,
     )
 
 
-def df2db(df: pl.DataFrame, db: Path, tablename: str) -> None:
+def load_receipt_data(
+    workers: int = 1, cache_dir: Path | None = None
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Load every receipt export, without the cancelled receipts
+
+    Parsing serially without a cache, the exports are scanned together
+    and the deduplication, cancellation filter and sort all run in one
+    lazy plan on the streaming engine. With `workers > 1` or a
+    `cache_dir`, files are parsed separately and merged in memory.
+
+    Parameters
+    ----------
+    workers : int
+        number of worker processes to parse files with, 1 to parse serially
+    cache_dir : Optional[Path]
+        directory of the Parquet parse cache, or None to always parse
+
+    Returns
+    -------
+    receipts : pl.DataFrame
+        one row per receipt, with per-item counts
+    receipt_items : pl.DataFrame
+        one row per (receipt_id, item, variant, quantity) line item
+    """
+    receipt_dir = Path("data/receipts")
+    files = sorted(receipt_dir.glob("*.csv"))
+
+    if cache_dir is None and (workers <= 1 or len(files) <= 1):
+        return _load_receipts(files, drop_cancelled=True)
+
+    receipts_df, items_df, _ = _split_cancelled(
+        *_load_receipt_files(files, workers, cache_dir)
+    )
+    return receipts_df.sort("timestamp", descending=True), items_df
+
+
+WriteMode = Literal["replace", "append", "upsert"]
+
+
+@contextmanager
+def transaction(con: duckdb.DuckDBPyConnection) -> Iterator[None]:
+    """Run the enclosed statements in one transaction, rolling back on error"""
+    con.begin()
+    try:
+        yield
+        con.commit()
+    except Exception:
+        try:
+            con.rollback()
+        except duckdb.Error:
+            # A failed commit has already ended the transaction, keep the
+            # error that caused it
+            pass
+        raise
+
+
+def _table_exists(con: duckdb.DuckDBPyConnection, tablename: str) -> bool:
+    return tablename in {res[0] for res in con.execute("SHOW TABLES").fetchall()}
+
+
+# Column each table is physically sorted on, so that DuckDB's min/max
+# zonemaps skip the row groups outside a range
+_CLUSTER_KEYS = {"receipts": "timestamp"}
+
+# (name, column, unique) of the indexes of each table, used by point lookups
+_INDEXES = {
+    "receipts": [
+        ("receipts_receipt_id", "receipt_id", True),
+        ("receipts_customer_name", "customer_name", False),
+    ],
+    "customers": [("customers_customer_id", "customer_id", True)],
+}
+
+# Rows per row group, the unit DuckDB skips using zonemaps
+_ROW_GROUP_SIZE = 122_880
+
+# Disorder above which a table is sorted again, see `clustering_disorder`
+RECLUSTER_DISORDER = 0.1
+
+
+def _staging_projection(df: pl.DataFrame, staging: str) -> str:
+    """Select from the staging table, creating Polars Enums as DuckDB ENUMs
+
+    Arrow hands Enums to DuckDB as strings, ENUM columns store one small
+    integer per row instead.
+    """
+    casts = []
+    for name, dtype in df.schema.items():
+        if isinstance(dtype, pl.Enum) and len(dtype.categories) > 0:
+            values = ", ".join(
+                "'" + value.replace("'", "''") + "'" for value in dtype.categories
+            )
+            casts.append(f'CAST("{name}" AS ENUM ({values})) AS "{name}"')
+
+    if not casts:
+        return f"FROM {staging}"
+    return f"SELECT * REPLACE ({', '.join(casts)}) FROM {staging}"
+
+
+def _create_indexes(con: duckdb.DuckDBPyConnection, tablename: str) -> None:
+    for name, column, unique in _INDEXES.get(tablename, []):
+        con.execute(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {name} '
+            f'ON "{tablename}" ("{column}")'
+        )
+
+
+def _row_group_disorder(
+    con: duckdb.DuckDBPyConnection, tablename: str
+) -> tuple[int, int]:
+    # Number of row groups, and of row groups whose zonemap reaches below
+    # the newest row of an earlier row group. Read from the storage info of
+    # the committed row groups, which the zonemaps are built from.
+    key = _CLUSTER_KEYS[tablename]
+    dtype = con.execute(
+        "SELECT data_type FROM duckdb_columns() "
+        "WHERE table_name = ? AND column_name = ?",
+        [tablename, key],
+    ).fetchone()[0]
+
+    def stat(name: str) -> str:
+        # e.g. "[Min: 2025-01-18 09:12:00, Max: 2025-01-18 20:45:00][...]"
+        return f"TRY_CAST(regexp_extract(stats, '{name}: ([^,\\]]*)', 1) AS {dtype})"
+
+    n_row_groups, n_widened = con.execute(f"""
+        WITH row_groups AS (
+            SELECT
+                row_group_id,
+                min({stat("Min")}) AS lo,
+                max({stat("Max")}) AS hi
+            FROM pragma_storage_info('{tablename}')
+            WHERE column_name = '{key}' AND segment_type != 'VALIDITY'
+            GROUP BY row_group_id
+        )
+        SELECT count(*), count(*) FILTER (lo < newest_before)
+        FROM (
+            SELECT lo, max(hi) OVER (
+                ORDER BY row_group_id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ) AS newest_before
+            FROM row_groups
+        )
+    """).fetchone()
+    return n_row_groups, n_widened
+
+
+def clustering_disorder(con: duckdb.DuckDBPyConnection, tablename: str) -> float:
+    """How far a table is from being sorted on its cluster key
+
+    The fraction of row groups holding rows older than the newest row of
+    an earlier row group. It is 0.0 when the table is sorted. Range scans
+    read every such row group whose zonemap was widened by late rows.
+    Only committed rows are counted, so measure it after the write's
+    transaction.
+    """
+    n_row_groups, n_widened = _row_group_disorder(con, tablename)
+    return n_widened / n_row_groups if n_row_groups else 0.0
+
+
+def cluster_table(con: duckdb.DuckDBPyConnection, tablename: str) -> None:
+    """Rewrite a table sorted on its cluster key, then restore its indexes"""
+    con.execute(f"""
+        CREATE OR REPLACE TABLE "{tablename}" AS
+        FROM "{tablename}"
+        ORDER BY "{_CLUSTER_KEYS[tablename]}"
+    """)
+    _create_indexes(con, tablename)
+
+
+def _has_late_rows(
+    con: duckdb.DuckDBPyConnection, df: pl.DataFrame, tablename: str
+) -> bool:
+    # Whether appending `df` puts rows behind the table's newest row
+    if df.is_empty() or not _table_exists(con, tablename):
+        return False
+    key = _CLUSTER_KEYS[tablename]
+    (newest,) = con.execute(f'SELECT max("{key}") FROM "{tablename}"').fetchone()
+    return newest is not None and df[key].min() < newest
+
+
+def recluster(con: duckdb.DuckDBPyConnection, tablename: str) -> bool:
+    """Sort a table again once late rows widened too many of its zonemaps
+
+    Call it after the rows are committed, the table is rewritten in a
+    transaction of its own. New rows are appended to the last row groups,
+    so one widened row group is tolerated: a rewrite then needs at least a
+    row group of new rows, or `RECLUSTER_DISORDER` of the table, since the
+    last one. The rows are unchanged, so the snapshot version isn't bumped.
+
+    Returns
+    -------
+    bool
+        whether the table was rewritten
+    """
+    if tablename not in _CLUSTER_KEYS or not _table_exists(con, tablename):
+        return False
+
+    n_row_groups, n_widened = _row_group_disorder(con, tablename)
+    if n_widened <= max(1, RECLUSTER_DISORDER * n_row_groups):
+        return False
+
+    with transaction(con):
+        cluster_table(con, tablename)
+    return True
+
+
+def write_table(
+    con: duckdb.DuckDBPyConnection,
+    df: pl.DataFrame,
+    tablename: str,
+    mode: WriteMode = "replace",
+    key: str | list[str] | None = None,
+) -> None:
+    """Bulk write a dataframe to a table
+
+    The dataframe is registered with DuckDB as an Arrow table, without
+    copying, and written in a single statement. Transactions are left to
+    the caller, see `transaction`. Every write bumps the snapshot version,
+    so the dashboard drops its cached query results. Tables with a cluster
+    key are sorted when they are created, see `recluster` for appends.
+
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection
+        connection to write with
+    df : pl.DataFrame
+        rows to write
+    tablename : str
+        name of the table, created from the dataframe if missing
+    mode : str
+        "replace" to overwrite the table, "append" to insert the rows, or
+        "upsert" to replace existing rows that share a `key`
+    key : str | list[str] | None
+        columns identifying a row, required for "upsert"
+    """
+    if mode == "upsert" and key is None:
+        raise ValueError("`key` is required to upsert")
+
+    staging = f"_{tablename}_staging"
+    con.register(staging, df.to_arrow())
+    try:
+        if mode == "replace" or not _table_exists(con, tablename):
+            order = ""
+            if tablename in _CLUSTER_KEYS:
+                order = f' ORDER BY "{_CLUSTER_KEYS[tablename]}"'
+            con.execute(
+                f'CREATE OR REPLACE TABLE "{tablename}" AS '
+                f"{_staging_projection(df, staging)}{order}"
+            )
+            _create_indexes(con, tablename)
+        else:
+            if mode == "upsert":
+                keys = [key] if isinstance(key, str) else key
+                on = " AND ".join(
+                    f'"{tablename}"."{k}" = {staging}."{k}"' for k in keys
+                )
+                con.execute(f'DELETE FROM "{tablename}" USING {staging} WHERE {on}')
+
+            con.execute(f'INSERT INTO "{tablename}" BY NAME FROM {staging}')
+
+        bump_snapshot_version(con)
+    finally:
+        con.unregister(staging)
+
+
+def df2db(
+    df: pl.DataFrame,
+    db: Path,
+    tablename: str,
+    mode: WriteMode = "replace",
+    key: str | list[str] | None = None,
+) -> None:
+    """Write a dataframe to a table of the database in one transaction,
+    see `write_table`."""
     db = Path(db)
     if not db.parent.exists():
         db.parent.mkdir(exist_ok=True)
 
     with duckdb.connect(database=db, read_only=False) as con:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE '{tablename}' AS
-            SELECT * FROM df
-        """)
+        with transaction(con):
+            write_table(con, df, tablename, mode, key)
+        if mode != "replace":
+            recluster(con, tablename)
     print(f"{tablename} table updated!")
 
 
-def load_holidays(year: int = 2025):
-    holidays_csv = Path(f"data/holidays/{year}.csv")
-    return pl.read_csv(holidays_csv, has_header=True, try_parse_dates=True)
+def _hash_file(fp: Path, chunk_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 digest of a file, reading it in chunks"""
+    digest = hashlib.sha256()
+    with open(fp, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
-def install_duckdb_gsheets_ext():
-    duckdb.sql("""
-    INSTALL gsheets FROM community;
-    LOAD gsheets;
+def _init_manifest(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
+            path VARCHAR PRIMARY KEY,
+            size BIGINT NOT NULL,
+            mtime DOUBLE NOT NULL,
+            content_hash VARCHAR NOT NULL,
+            ingested_at TIMESTAMP NOT NULL
+        )
     """)
 
 
-def authenticate_sheets(credentials: Path) -> bool:
-    credentials = Path(credentials)
-    if not credentials.exists():
-        raise FileNotFoundError
+def pending_files(
+    con: duckdb.DuckDBPyConnection, files: list[Path]
+) -> tuple[list[Path], list[tuple]]:
+    """Compare files against the ingestion manifest
 
-    install_duckdb_gsheets_ext()
-    success = duckdb.sql(f"""
-    CREATE OR REPLACE PERSISTENT SECRET (
-        TYPE gsheet,
-        PROVIDER key_file,
-        FILEPATH '{credentials}' 
-    )
-    """).fetchone()[0]
-
-    if not success:
-        print("Failed to authenticate with Google Sheets")
-
-    return success
-
-
-def gsheets2df(
-    url: str,
-    credentials: Path,
-    sheet_name: str,
-    sheet_range: str,
-    has_header: bool = True,
-):
-    authenticate_sheets(credentials)
-    query = f"""
-    FROM read_gsheet(
-        '{url}',
-        header = {"true" if has_header else "false"},
-        sheet = '{sheet_name}',
-        range = '{sheet_range}'
-    )
+    Files whose size and mtime match the manifest are skipped without
+    being read. Files that were touched but whose content hash is
+    unchanged are not re-parsed, but their manifest entry is refreshed.
+
+    Returns
+    -------
+    changed : list[Path]
+        new or modified files that need to be parsed
+    entries : list[tuple]
+        manifest rows (path, size, mtime, content_hash, ingested_at) to
+        upsert once the changed files have been loaded
     """
-    result = duckdb.sql(query)
-    df = result.fetchdf()
+    _init_manifest(con)
+    manifest = {
+        path: (size, mtime, content_hash)
+        for path, size, mtime, content_hash in con.execute(
+            "SELECT path, size, mtime, content_hash FROM ingest_manifest"
+        ).fetchall()
+    }
+
+    now = datetime.now()
+    changed, entries = [], []
+    for fp in sorted(files):
+        stat = fp.stat()
+        previous = manifest.get(str(fp))
+        if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime):
+            continue
+
+        content_hash = _hash_file(fp)
+        entries.append((str(fp), stat.st_size, stat.st_mtime, content_hash, now))
+        if previous is None or previous[2] != content_hash:
+            changed.append(fp)
+
+    return changed, entries
+
+
+def _write_manifest(con: duckdb.DuckDBPyConnection, entries: list[tuple]) -> None:
+    con.executemany(
+        "INSERT OR REPLACE INTO ingest_manifest VALUES (?, ?, ?, ?, ?)",
+        entries,
+    )
+
+
+def record_ingested_files(db: Path, receipt_dir: Path = Path("data/receipts")) -> None:
+    """Mark every receipt export as ingested, e.g. after a full rebuild"""
+    with duckdb.connect(database=db, read_only=False) as con:
+        _, entries = pending_files(con, list(receipt_dir.glob("*.csv")))
+        _write_manifest(con, entries)
+
 
-    if len(df) == 0:
-        print("Returned a dataframe of length 0, exiting...")
+def upsert_receipts(
+    con: duckdb.DuckDBPyConnection, df: pl.DataFrame, items_df: pl.DataFrame
+) -> None:
+    """Insert receipts and their line items, replacing rows that share a
+    `receipt_id`. Must be called inside a transaction."""
+    write_table(con, df, "receipts", mode="upsert", key="receipt_id")
+
+    # Clear every upserted receipt's items, not only those that are re-added
+    if _table_exists(con, "receipt_items"):
+        keys = df.select("receipt_id")
+        con.execute("""
+            DELETE FROM receipt_items
+            WHERE receipt_id IN (SELECT receipt_id FROM keys)
+        """)
+    write_table(con, items_df, "receipt_items", mode="append")
+
+
+def delete_receipts(con: duckdb.DuckDBPyConnection, receipt_ids: pl.Series) -> None:
+    """Delete receipts and their line items. Must be called inside a
+    transaction."""
+    if receipt_ids.is_empty():
         return
 
-    df = pl.from_pandas(df).with_columns(
-        pl.col("date").str.to_date("%m/%d/%Y"),
-        pl.col("quantity").cast(pl.Int32),
-        pl.col("total_cost").cast(pl.Float32),
+    # Joined as a table, so that its receipt_id range is pushed down to the
+    # zonemaps and only the row groups of these receipts are scanned
+    ids = receipt_ids.to_frame("receipt_id")
+    for tablename in ["receipt_items", "receipts"]:
+        if _table_exists(con, tablename):
+            con.execute(f"""
+                DELETE FROM {tablename}
+                WHERE receipt_id IN (SELECT receipt_id FROM ids)
+            """)
+
+
+def sync_receipt_data(
+    db: Path,
+    receipt_dir: Path = Path("data/receipts"),
+    workers: int = 1,
+    cache_dir: Path | None = None,
+) -> int:
+    """Incrementally ingest new or changed receipt exports
+
+    Only files that are missing from, or differ from, the ingestion
+    manifest are parsed. Their receipts are upserted by `receipt_id`,
+    receipts they cancel are deleted, and only the affected rows of the
+    summary tables are recomputed, so a sync costs time proportional to
+    the new data rather than the full history.
+
+    Parameters
+    ----------
+    db : Path
+        path to the DuckDB database
+    receipt_dir : Path
+        directory containing the exported POS receipt CSVs
+    workers : int
+        number of worker processes to parse files with, 1 to parse serially
+    cache_dir : Optional[Path]
+        directory of the Parquet parse cache, or None to always parse
+
+    Returns
+    -------
+    int
+        number of receipts inserted or updated
+    """
+    db = Path(db)
+    if not db.parent.exists():
+        db.parent.mkdir(exist_ok=True)
+
+    with duckdb.connect(database=db, read_only=False) as con:
+        changed, entries = pending_files(con, list(receipt_dir.glob("*.csv")))
+        if not changed and summaries_exist(con):
+            # Touched exports with the same content only refresh their
+            # manifest entries, the rows and cached query results are kept
+            if entries:
+                with transaction(con):
+                    _write_manifest(con, entries)
+            print("receipts table is up to date!")
+            return 0
+
+        df = items_df = None
+        if changed:
+            df, items_df = _load_receipt_files(changed, workers, cache_dir)
+
+        late_rows = False
+        with transaction(con):
+            with maintain_summaries(con, df):
+                if df is not None:
+                    receipts_df, items_df, cancelled = _split_cancelled(df, items_df)
+                    late_rows = _has_late_rows(con, receipts_df, "receipts")
+                    upsert_receipts(con, receipts_df, items_df)
+                    delete_receipts(con, cancelled)
+            _write_manifest(con, entries)
+            bump_snapshot_version(con)
+
+        # Only upserted rows older than the table's latest rows widen the
+        # zonemaps, re-sort once range scans read too many row groups
+        if late_rows:
+            recluster(con, "receipts")
+
+    n_rows = 0 if df is None else df.height
+    print(f"receipts table updated with {n_rows} rows from {len(changed)} files!")
+    return n_rows
+
+
+def load_holidays(year: int = 2025):
+    holidays_csv = Path(f"data/holidays/{year}.csv")
+    return pl.read_csv(holidays_csv, has_header=True, try_parse_dates=True)
+
+
+def build_dim_date_table(db: Path) -> None:
+    """Build the `dim_date` table, spanning every year with receipts or
+    expenses up to the current year"""
+    with duckdb.connect(database=db, read_only=False) as con:
+        start, end = con.execute("""
+            SELECT min(date), max(date) FROM (
+                SELECT timestamp::DATE AS date FROM receipts
+                UNION ALL
+                SELECT date FROM expenses
+            )
+        """).fetchone()
+        # A fresh database has no dates yet, the calendar starts today
+        today = date.today()
+        start = start or today
+        end = max(end or today, today)
+
+        holidays = [
+            load_holidays(year).select(pl.col("date").cast(pl.Date), "name")
+            for year in range(start.year, end.year + 1)
+            if Path(f"data/holidays/{year}.csv").exists()
+        ]
+        dim_date = build_dim_date(start, end, pl.concat(holidays) if holidays else None)
+
+        with transaction(con):
+            write_table(con, dim_date, "dim_date")
+    print("dim_date table updated!")
+
+
+def build_summary_tables(db: Path) -> None:
+    """Rebuild the daily, monthly, hourly and per-customer summaries of
+    the receipts, see `rollups.SUMMARY_TABLES`"""
+    with duckdb.connect(database=db, read_only=False) as con, transaction(con):
+        build_summaries(con)
+        bump_snapshot_version(con)
+    print("summary tables updated!")
+
+
+# Tables a full rebuild recreates from the exports and sheets. The others,
+# e.g. orders taken at the counter, exist only in the database.
+DERIVED_TABLES = [
+    "customers",
+    "receipts",
+    "receipt_items",
+    "expenses",
+    "items",
+    "dim_date",
+    "ingest_manifest",
+    *SUMMARY_TABLES,
+]
+
+
+def drop_derived_tables(db: Path) -> None:
+    """Drop the tables of a full rebuild, keeping orders and the snapshot
+    version, so the database file is never deleted"""
+    db = Path(db)
+    if not db.parent.exists():
+        db.parent.mkdir(exist_ok=True)
+
+    with duckdb.connect(database=db, read_only=False) as con, transaction(con):
+        for tablename in DERIVED_TABLES:
+            con.execute(f'DROP TABLE IF EXISTS "{tablename}"')
+        bump_snapshot_version(con)
+    print("derived tables dropped!")
+
+
+EXPENSES_URL = "https://docs.google.com/spreadsheets/d/1PmYbcvwLeMfUiV9WDSWSfo_J45qzOXHEgYvvFOQzygA/edit"
+
+_EXPENSE_COLUMNS = [
+    "date",
+    "item_name",
+    "note",
+    "category",
+    "subcategory",
+    "quantity",
+    "unit",
+    "total_cost",
+]
+
+
+def _clean_expenses(df: pl.DataFrame) -> pl.DataFrame:
+    return df.select(_EXPENSE_COLUMNS).with_columns(
+        pl.col("date").cast(pl.String).str.to_date("%m/%d/%Y"),
+        pl.col("quantity").cast(pl.Int16),
+        pl.col("total_cost")
+        .cast(pl.String)
+        .str.replace_all(",", "")
+        .cast(pl.Decimal(12, 2)),
+        pl.col("category", "subcategory", "unit").cast(pl.String),
     )
 
-    return df
-
-
-def load_expense_data() -> pl.DataFrame:
-    sheets = {
-        "capital_expenses": "A1:H108",
-        "Jan2025": "A1:H4",
-        "Feb2025": "A1:H25",
-        "Mar2025": "A1:H27",
-        "Apr2025": "A1:H41",
-        "May2025": "A1:H30",
-        "June2025": "A1:H33",
-        "July2025": "A1:H41",
-        "Aug2025": "A1:H38",
-        "Sep2025": "A1:H22",
-    }
-    credentials = "credentials.json"
-    url = "https://docs.google.com/spreadsheets/d/1PmYbcvwLeMfUiV9WDSWSfo_J45qzOXHEgYvvFOQzygA/edit"
 
-    _expenses = []
-    for sheet_name, sheet_range in sheets.items():
-        _expenses.append(gsheets2df(url, credentials, sheet_name, sheet_range, True))
+def load_expense_data(source: SheetSource | None = None) -> pl.DataFrame:
+    """Load every expense sheet
+
+    Sheets and their used ranges are discovered from the source and
+    fetched concurrently.
+
+    Parameters
+    ----------
+    source : Optional[SheetSource]
+        where to read the sheets from, defaults to the expenses spreadsheet
+    """
+    if source is None:
+        source = GoogleSheetSource(EXPENSES_URL, Path("credentials.json"))
+
+    sheets = fetch_sheets(source)
+    frames = [_clean_expenses(df) for df in sheets.values() if df.height > 0]
+    if not frames:
+        # No expenses yet, keep the columns and their types
+        empty = pl.DataFrame(schema=dict.fromkeys(_EXPENSE_COLUMNS, pl.String))
+        frames = [_clean_expenses(empty)]
+    df = pl.concat(frames)
+
+    # Expenses are replaced on every sync, so their categories are fixed
+    return df.with_columns(
+        pl.col(col).cast(pl.Enum(df[col].drop_nulls().unique().sort()))
+        for col in ["category", "subcategory", "unit"]
+    )
 
-    return pl.concat(_expenses)
 
 def item_list():
+    # Named as on POS receipts, so that orders and receipts share their
+    # line items, see `ITEM_COUNTS`
     return [
-        Item(name="Ariel Detergent", category="soap", cost=18.0),
-        Item(name="Downey Fabcon", category="soap", cost=12.0),
+        Item(name="Ariel Liquid Detergent", category="soap", cost=18.0),
+        Item(name="Downy Fabcon", category="soap", cost=12.0),
         Item(name="Zonrox Colorsafe Bleach", category="soap", cost=6.0),
-        Item(name="Regular Wash", category="service", cost=65.0),
+        Item(name="Wash", category="service", cost=65.0),
         Item(name="TITAN Wash", category="service", cost=80.0),
         Item(name="Hand Wash", category="service", cost=45.0),
-        Item(name="Regular Dry", category="service", cost=65.0),
+        Item(name="Dry", category="service", cost=65.0),
         Item(name="TITAN Dry", category="service", cost=90.0),
-        Item(name="Extra Regular Dry", category="service", cost=17.0),
+        Item(name="Extra Dry", category="service", cost=17.0),
         Item(name="Extra TITAN Dry", category="service", cost=17.0),
         Item(name="Fold", category="service", cost=35.0),
     ]
@@ -328,38 +998,107 @@ def build_items_table(db) -> None:
         deleted_at TIMESTAMP
     );
     """
+    items_df = pl.DataFrame(
+        [item.model_dump() for item in item_list()],
+        schema_overrides={"deleted_at": pl.Datetime("us")},
+    )
+
     with duckdb.connect(database=db, read_only=False) as con:
-        # Initialize item tables
-        con.execute(query)
+        with transaction(con):
+            # Initialize item tables
+            con.execute(query)
 
-        # Insert individual items
-        for item in item_list():
-            con.execute(f"""
-            INSERT INTO items (name, category, cost, created_at, updated_at) 
-            VALUES ('{item.name}', '{item.category}', {item.cost}, '{item.created_at}', '{item.updated_at}');
-            """)
+            # Insert every item in one statement
+            write_table(con, items_df, "items", mode="append")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the cleannest database")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only ingest receipt exports that are new or changed since the last sync",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to parse receipt exports (default: serial)",
+    )
+    parser.add_argument(
+        "--sheets-dir",
+        type=Path,
+        help="read expense sheets from <sheet>.csv files in this directory",
+    )
+    parser.add_argument(
+        "--lake",
+        action="store_true",
+        help="also export receipts, receipt items and expenses as partitioned Parquet",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="re-parse every receipt export instead of reading the parse cache",
+    )
+    parser.add_argument(
+        "--check-summaries",
+        action="store_true",
+        help="compare the summary tables with a full recompute after the sync",
+    )
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else RECEIPT_CACHE_DIR
+
     print("Loading customer data...")
     customers_df = load_customer_data()
 
-    print("Loading receipt data...")
-    receipts_df = load_receipt_data()
+    if not args.incremental:
+        print("Loading receipt data...")
+        receipts_df, receipt_items_df = load_receipt_data(args.workers, cache_dir)
 
     print("Loading expense data...")
-    expenses_df = load_expense_data()
+    expenses_df = load_expense_data(
+        LocalSheetSource(args.sheets_dir) if args.sheets_dir else None
+    )
 
     db = "cleannest/db/main.db"
 
+    if not args.incremental:
+        # Rebuilt from scratch, except for the orders
+        drop_derived_tables(db)
+
     print("Generating `customer` table...")
     df2db(customers_df, db, "customers")
 
     print("Generating `receipt` table...")
-    df2db(receipts_df, db, "receipts")
+    if args.incremental:
+        sync_receipt_data(db, workers=args.workers, cache_dir=cache_dir)
+    else:
+        df2db(receipts_df, db, "receipts")
+        df2db(receipt_items_df, db, "receipt_items")
+        record_ingested_files(db)
 
     print("Generating `expense` table...")
     df2db(expenses_df, db, "expenses")
 
     print("Generating `items` table...")
     build_items_table(db)
+
+    print("Generating `dim_date` table...")
+    build_dim_date_table(db)
+
+    if not args.incremental:
+        # Incremental syncs maintain the summaries as they go
+        print("Generating summary tables...")
+        build_summary_tables(db)
+
+    if args.check_summaries:
+        with duckdb.connect(database=db, read_only=True) as con:
+            mismatches = check_summaries(con)
+        print(f"summary rows differing from a full recompute: {mismatches}")
+
+    if args.lake:
+        print("Exporting Parquet lake...")
+        with duckdb.connect(database=db, read_only=False) as con:
+            export_lake(con)
+            # The lake views read the new files from now on
+            bump_snapshot_version(con)
@@ -0,0 +1,45 @@
+import polars as pl
+
+
+# Matches a single "<quantity> x [<variant> ]<item>" description token
+ITEM_PATTERN = r"^\s*(?<quantity>\d+) x (?:(?<variant>.+) )?(?<item>\S+)\s*$"
+
+
+def parse_items(df: pl.LazyFrame | pl.DataFrame, key: str) -> pl.LazyFrame:
+    """Split each description into one row per line item
+
+    A description such as `2 x TITAN Wash, 1 x Fold` becomes the rows
+    (key, "wash", "TITAN", 2) and (key, "fold", None, 1). The last word of
+    a token is the item and anything before it is the variant, so new
+    catalog items are picked up without new patterns. Receipts and orders
+    share this vocabulary.
+
+    Parameters
+    ----------
+    df : pl.LazyFrame | pl.DataFrame
+        rows with a `description` column
+    key : str
+        column identifying the row, e.g. `receipt_id` or `order_id`
+    """
+    return (
+        df.lazy()
+        .select(
+            key,
+            pl.col("description").str.split(",").alias("token"),
+        )
+        .explode("token")
+        .select(
+            key,
+            pl.col("token").str.extract_groups(ITEM_PATTERN).alias("groups"),
+        )
+        .unnest("groups")
+        .filter(pl.col("item").is_not_null())
+        .select(
+            key,
+            pl.col("item").str.to_lowercase(),
+            "variant",
+            # Quantities aren't capped, one beyond INTEGER fails the parse
+            # rather than being dropped
+            pl.col("quantity").cast(pl.Int32),
+        )
+    )
@@ -0,0 +1,129 @@
+import json
+import shutil
+from pathlib import Path
+
+import duckdb
+
+
+LAKE_DIR = Path(__file__).parent / "db" / "lake"
+
+# Queries selecting each table's rows along with its partition columns
+LAKE_TABLES = {
+    "receipts": """
+        SELECT *, year(timestamp) AS year, month(timestamp) AS month
+        FROM receipts
+    """,
+    "receipt_items": """
+        SELECT i.*, year(r.timestamp) AS year, month(r.timestamp) AS month
+        FROM receipt_items i
+        JOIN receipts r USING (receipt_id)
+    """,
+    "expenses": """
+        SELECT *, year(date) AS year, month(date) AS month
+        FROM expenses
+    """,
+}
+
+
+def _partition(year: int | None, month: int | None) -> str:
+    # Same layout as DuckDB's hive-partitioned writes
+    return "/".join(
+        f"{name}={'NULL' if value is None else value}"
+        for name, value in [("year", year), ("month", month)]
+    )
+
+
+def _partition_checksums(
+    con: duckdb.DuckDBPyConnection, query: str
+) -> dict[str, list]:
+    rows = con.execute(f"""
+        SELECT year, month, count(*), sum(hash(t)::HUGEINT)
+        FROM ({query}) t
+        GROUP BY ALL
+    """).fetchall()
+    return {
+        _partition(year, month): [year, month, n_rows, str(checksum)]
+        for year, month, n_rows, checksum in rows
+    }
+
+
+def export_table(
+    con: duckdb.DuckDBPyConnection, tablename: str, lake_dir: Path = LAKE_DIR
+) -> int:
+    """Export a table as Parquet files partitioned by `year=/month=`
+
+    A checksum of every partition is kept next to the files, and only
+    partitions whose rows changed since the last export are rewritten.
+
+    Returns
+    -------
+    int
+        number of partitions written
+    """
+    table_dir = Path(lake_dir) / tablename
+    checksums_fp = table_dir / "_checksums.json"
+
+    previous = {}
+    if checksums_fp.exists():
+        previous = json.loads(checksums_fp.read_text())
+    current = _partition_checksums(con, LAKE_TABLES[tablename])
+
+    changed = [p for p, checksum in current.items() if previous.get(p) != checksum]
+    for partition in changed + [p for p in previous if p not in current]:
+        shutil.rmtree(table_dir / partition, ignore_errors=True)
+
+    table_dir.mkdir(parents=True, exist_ok=True)
+    if changed:
+        months = [current[p][:2] for p in changed]
+        predicate = " OR ".join(
+            "(year IS NOT DISTINCT FROM ? AND month IS NOT DISTINCT FROM ?)"
+            for _ in months
+        )
+        con.execute(
+            f"""
+            COPY (
+                SELECT * FROM ({LAKE_TABLES[tablename]})
+                WHERE {predicate}
+            ) TO '{table_dir}' (
+                FORMAT parquet,
+                PARTITION_BY (year, month),
+                OVERWRITE_OR_IGNORE
+            )
+            """,
+            [value for month in months for value in month],
+        )
+
+    checksums_fp.write_text(json.dumps(current, indent=2))
+    return len(changed)
+
+
+def export_lake(con: duckdb.DuckDBPyConnection, lake_dir: Path = LAKE_DIR) -> None:
+    """Export every lake table that exists in the database"""
+    tables = {res[0] for res in con.execute("SHOW TABLES").fetchall()}
+    for tablename in LAKE_TABLES:
+        if tablename in tables:
+            n_partitions = export_table(con, tablename, lake_dir)
+            print(f"{tablename} lake updated, {n_partitions} partitions written!")
+
+
+def create_lake_views(
+    con: duckdb.DuckDBPyConnection, lake_dir: Path = LAKE_DIR
+) -> None:
+    """Expose the exported tables as views over their Parquet partitions
+
+    The views are temporary, so they shadow the tables of the same name
+    for this connection only.
+    """
+    for tablename in LAKE_TABLES:
+        table_dir = Path(lake_dir) / tablename
+        if not any(table_dir.glob("*/*/*.parquet")):
+            continue
+
+        con.execute(f"""
+            CREATE OR REPLACE TEMP VIEW {tablename} AS
+            SELECT * FROM read_parquet(
+                '{table_dir}/*/*/*.parquet',
+                hive_partitioning = true,
+                union_by_name = true
+            )
+        """)
@@ -0,0 +1,199 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, ContextManager
+
+import duckdb
+import polars as pl
+
+from .dates import day_key
+from .items import parse_items
+from .models import Order
+
+
+ORDER_TABLES = {
+    "orders": """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id UUID PRIMARY KEY,
+            timestamp TIMESTAMP NOT NULL,
+            day_key INTEGER NOT NULL,
+            customer_id VARCHAR,
+            customer_name VARCHAR,
+            description VARCHAR NOT NULL,
+            gross_sales DECIMAL(10, 2) NOT NULL
+        )
+    """,
+    "order_items": """
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id UUID NOT NULL,
+            item VARCHAR NOT NULL,
+            variant VARCHAR,
+            quantity SMALLINT NOT NULL
+        )
+    """,
+}
+
+# Orders written per transaction, and how long the writer waits for more
+# orders to join a batch, in seconds
+MAX_BATCH = 64
+MAX_WAIT = 0.05
+
+
+def orders_frame(orders: list[tuple[str, Order]]) -> pl.DataFrame:
+    """Rows of the `orders` table, with descriptions in the POS export
+    format, e.g. `1 x Wash, 2 x Ariel Liquid Detergent`"""
+    return pl.DataFrame(
+        {
+            "order_id": [order_id for order_id, _ in orders],
+            "timestamp": [order.created_at for _, order in orders],
+            "customer_id": [order.customer.id for _, order in orders],
+            "customer_name": [order.customer.name for _, order in orders],
+            "description": [", ".join(order.to_list()) for _, order in orders],
+            "gross_sales": [order.total() for _, order in orders],
+        },
+        schema_overrides={"timestamp": pl.Datetime("us")},
+    ).with_columns(
+        day_key("timestamp").alias("day_key"),
+        pl.col("gross_sales").cast(pl.Decimal(10, 2)),
+    )
+
+
+def write_orders(
+    con: duckdb.DuckDBPyConnection, orders: list[tuple[str, Order]]
+) -> None:
+    """Insert orders and their line items
+
+    Line items are parsed from the descriptions like receipt items, so
+    `order_items` and `receipt_items` share their vocabulary.
+    Transactions are left to the caller.
+
+    The snapshot version isn't bumped, so orders taken at the counter
+    don't drop the dashboard's cached results. Orders are read around the
+    query cache instead, see `CleannestDatabase.fetch_orders`.
+    """
+    for query in ORDER_TABLES.values():
+        con.execute(query)
+
+    orders_df = orders_frame(orders)
+    items_df = parse_items(orders_df, "order_id").collect()
+
+    con.register("_orders", orders_df.to_arrow())
+    con.register("_order_items", items_df.to_arrow())
+    try:
+        con.execute("INSERT INTO orders BY NAME FROM _orders")
+        con.execute("INSERT INTO order_items BY NAME FROM _order_items")
+    finally:
+        con.unregister("_orders")
+        con.unregister("_order_items")
+
+
+class OrderWriter:
+    """Writes submitted orders to the database from a background thread
+
+    Order forms only put orders on a queue, so several sessions can submit
+    at once without waiting on each other for the write lock. The writer
+    thread takes every order waiting on the queue, up to `MAX_BATCH`, and
+    commits them in one transaction. Pending orders are flushed when the
+    process exits.
+    """
+
+    _writers: dict[int, "OrderWriter"] = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(
+        self,
+        writer: Callable[[], ContextManager[duckdb.DuckDBPyConnection]],
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT,
+    ):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue[tuple[str, Order, Future] | None] = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="cleannest-order-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def get(cls, pool) -> "OrderWriter":
+        """Return the writer of a `ConnectionPool`, starting it on first use"""
+        with cls._writers_lock:
+            if id(pool) not in cls._writers:
+                cls._writers[id(pool)] = cls(pool.writer)
+            return cls._writers[id(pool)]
+
+    def submit(self, order: Order) -> Future:
+        """Queue an order to be written
+
+        Returns
+        -------
+        Future
+            resolves to the order's id once it is committed, or to the
+            error that prevented the write
+        """
+        future = Future()
+        self._queue.put((str(uuid.uuid4()), order, future))
+        return future
+
+    def close(self) -> None:
+        """Write the pending orders and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _next_batch(self) -> tuple[list[tuple[str, Order, Future]], bool]:
+        # Block for the first order, then give others a moment to join
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                pending = self._queue.get(
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except queue.Empty:
+                break
+            if pending is None:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    def _write(self, batch: list[tuple[str, Order, Future]]) -> None:
+        with self.writer() as con:
+            write_orders(con, [(order_id, order) for order_id, order, _ in batch])
+
+    def _run(self) -> None:
+        closed = False
+        while not closed:
+            batch, closed = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][2].set_exception(e)
+                    continue
+
+                # Write the orders one at a time, so one bad order doesn't
+                # reject the orders it was batched with
+                for pending in batch:
+                    try:
+                        self._write([pending])
+                    except Exception as e:
+                        pending[2].set_exception(e)
+                    else:
+                        pending[2].set_result(pending[0])
+                continue
+
+            for order_id, _, future in batch:
+                future.set_result(order_id)
@@ -7,3 +7,6 @@ class Default(StrEnum):
     NAVY = "#D9E2EF"
     WHITE = "#FFFFFF"
     BLACK = "#333333"
+    RED = "#C8102E"
+    GREEN = "#2E8B57"
+    PURPLE = "#6A4C93"
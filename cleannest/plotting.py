@@ -1,75 +1,178 @@
+import json
+from contextlib import nullcontext
 from datetime import date, timedelta
-from typing import Optional
+from typing import Callable, Optional
 
 from streamlit_echarts import st_echarts
 import altair as alt
 import polars as pl
+import streamlit as st
 
 from .database import CleannestDatabase
 from .palettes import Default
 
 DATABASE = CleannestDatabase()
 
+ROLLING_METHODS = ["mean", "median", "ewma"]
+ROLLING_COLORS = [Default.ORANGE, Default.RED, Default.GREEN, Default.PURPLE]
+
+
+# Rows a chart may send to the browser, after its transforms are evaluated
+CHART_MAX_ROWS = 5_000
+
+# Offset of the first calendar of a heatmap, below its legend, and the
+# space between the calendars of consecutive years, in pixels
+CALENDAR_TOP = 60
+CALENDAR_YEAR_PADDING = 40
+
+
+def _pre_transform(chart: alt.TopLevelMixin) -> alt.TopLevelMixin:
+    """Replace a chart's data by the output of its `transform_*` steps
+
+    The transforms are evaluated with VegaFusion on the server, so only
+    their result, e.g. one row per group of an aggregate, is embedded in
+    the spec. Encoding channels, including their aggregates and time
+    units, are still evaluated by the browser on that result. Transforms
+    that depend on selections are left to the browser.
+    """
+    if isinstance(chart, alt.LayerChart):
+        chart = chart.copy(deep=False)
+        chart.layer = [_pre_transform(layer) for layer in chart.layer]
+        return chart
+
+    if (
+        not isinstance(chart, alt.Chart)
+        or not isinstance(chart.data, pl.DataFrame)
+        or chart.transform is alt.Undefined
+    ):
+        return chart
+
+    transforms = [t.to_dict() for t in chart.transform]
+    if '"param"' in json.dumps(transforms):
+        return chart
+
+    # VegaFusion compares timestamps, not dates, and takes plain strings
+    data = chart.data.with_columns(
+        pl.col(pl.Date).cast(pl.Datetime("ms")),
+        pl.col(pl.Categorical, pl.Enum).cast(pl.String),
+    )
+    steps = alt.Chart(data, transform=chart.transform).mark_point()
+    with alt.data_transformers.enable("vegafusion"):
+        transformed = steps.transformed_data()
+
+    chart = chart.copy(deep=False)
+    chart.data = transformed
+    chart.transform = alt.Undefined
+    return chart
+
+
+def compile_chart(chart: alt.TopLevelMixin, max_rows: int = CHART_MAX_ROWS) -> dict:
+    """Compile a chart to a Vega-Lite spec with its data inline
+
+    Raises `alt.MaxRowsError` if a dataset still has more than `max_rows`
+    rows after its transforms are evaluated.
+    """
+    chart = _pre_transform(chart)
+
+    # Like `st.altair_chart`, leave the sizing to Streamlit
+    theme = (
+        alt.theme.enable("none") if alt.theme.active == "default" else nullcontext()
+    )
+    with theme, alt.data_transformers.enable("default", max_rows=max_rows):
+        return chart.to_dict()
+
+
+def altair_chart(
+    name: str,
+    params: list,
+    build: Callable[[], alt.TopLevelMixin],
+    max_rows: int = CHART_MAX_ROWS,
+    **kwargs,
+):
+    """Render a chart from a cached, pre-transformed spec
+
+    Specs are cached per snapshot version, keyed by `name` and `params`,
+    so a rerun of the page neither rebuilds the chart nor re-evaluates its
+    transforms, see `compile_chart`.
+
+    Parameters
+    ----------
+    name : str
+        name of the chart, unique across pages
+    params : list
+        every input of `build` besides the database, e.g. a date range
+    build : Callable[[], alt.TopLevelMixin]
+        builds the chart, only called when the spec isn't cached
+    max_rows : int
+        row budget of each of the chart's datasets
+    **kwargs
+        passed to `st.vega_lite_chart`, e.g. `use_container_width`
+    """
+    spec = DATABASE.cached(
+        f"chart {name}", [*params, max_rows], lambda: compile_chart(build(), max_rows)
+    )
+    return st.vega_lite_chart(spec=spec, **kwargs)
+
+
+class _Fetched:
+    """A class attribute fetched from the database when it is read
+
+    Nothing is loaded at import, and reads go through the query cache, so
+    they return the same dataframe until ingestion bumps the snapshot
+    version.
+    """
+
+    def __init__(self, fetch: Callable[[], pl.DataFrame]):
+        self.fetch = fetch
+
+    def __get__(self, instance, owner) -> pl.DataFrame:
+        return self.fetch()
+
 
 class Stats:
-    customers = DATABASE.fetch_customers()
-    receipts = DATABASE.fetch_receipts()
+    monthly = _Fetched(DATABASE.fetch_monthly_summary)
+    customer_summary = _Fetched(DATABASE.fetch_customer_summary)
+
+    @classmethod
+    def kpis(cls, start: Optional[date] = None, end: Optional[date] = None):
+        """Every metric below, evaluated in one query, see
+        `CleannestDatabase.fetch_kpis`"""
+        return DATABASE.fetch_kpis(start, end)
 
     @classmethod
     def total_customer_count(cls):
-        return cls.customers["customer_name"].unique().len()
+        return cls.kpis()["total_customer_count"]
 
     @classmethod
     def total_returning_customer_count(cls):
-        df = (
-            cls.receipts.filter(pl.col("gross_sales") > 100)
-            .group_by("customer_name")
-            .agg(pl.col("receipt_id").len().alias("n_transactions"))
-            .filter(pl.col("n_transactions") > 1)
-        )
-        return df.height
+        return cls.kpis()["total_returning_customer_count"]
 
     @classmethod
     def total_revenue(cls):
-        return cls.receipts["gross_sales"].sum()
+        return cls.kpis()["total_revenue"]
 
     @classmethod
     def daily_average_revenue(cls):
-        return (
-            cls.receipts.group_by(pl.col("timestamp").dt.date())
-            .agg(pl.col("gross_sales").sum())["gross_sales"]
-            .mean()
-        )
+        return cls.kpis()["daily_average_revenue"]
 
     @classmethod
     def total_revenue_today(cls):
-        return cls.receipts.filter(
-            pl.col("timestamp") >= pl.col("timestamp").dt.date().max()
-        )["gross_sales"].sum()
+        return cls.kpis()["total_revenue_today"]
 
     @classmethod
     def total_load_count(cls):
-        return cls.receipts["n_fold"].sum()
+        return cls.kpis()["total_load_count"]
 
     @classmethod
     def daily_average_load_count(cls):
-        return (
-            cls.receipts.group_by(pl.col("timestamp").dt.date())
-            .agg(pl.col("n_fold").sum())["n_fold"]
-            .mean()
-        )
+        return cls.kpis()["daily_average_load_count"]
 
     @classmethod
     def total_load_count_today(cls):
-        return cls.receipts.filter(
-            pl.col("timestamp") >= pl.col("timestamp").dt.date().max()
-        )["n_fold"].sum()
+        return cls.kpis()["total_load_count_today"]
 
 
 class Charts:
-    customers = DATABASE.fetch_customers()
-    receipts = DATABASE.fetch_receipts()
-
     @classmethod
     def df(
         cls,
@@ -77,26 +180,21 @@ class Charts:
         end: Optional[date] = date.today() + timedelta(days=1),
     ):
         return (
-            cls.receipts.filter(
-                pl.col("timestamp") >= start,
-                pl.col("timestamp") < end,
-            )
-            .group_by(
-                pl.col("timestamp").dt.date(),
-            )
-            .agg(
-                total_gross=pl.col("gross_sales").sum(),
-                unique_customers=pl.col("customer_name").unique().len(),
-                customers=pl.col("customer_name").unique(),
-                full_loads=pl.col("is_full_load").sum(),
-                titan_runs=pl.col("is_titan").sum(),
-                hours_with_customer=pl.col("timestamp").max()
-                - pl.col("timestamp").min(),
-                n_detergent=pl.col("n_detergent").sum(),
-                n_fabcon=pl.col("n_fabcon").sum(),
-                n_bleach=pl.col("n_bleach").sum(),
-                visits=pl.col("timestamp"),
-                receipts=pl.col("receipt_id"),
+            DATABASE.fetch_daily_summary(start, end)
+            .select(
+                pl.col("date").alias("timestamp"),
+                "total_gross",
+                "unique_customers",
+                "customers",
+                "full_loads",
+                "titan_runs",
+                (pl.col("last_visit") - pl.col("first_visit")).alias(
+                    "hours_with_customer"
+                ),
+                "n_detergent",
+                "n_fabcon",
+                "n_bleach",
+                "receipts",
             )
             .with_columns(
                 titan_usage=(pl.col("titan_runs") / pl.col("full_loads")).round(3)
@@ -133,22 +231,106 @@ class Charts:
         )
 
     @classmethod
-    def daily_rolling_revenue(
+    def rolling(
         cls,
-        df: pl.DataFrame,
-        window_size: int = 14,
-    ):
-        return (
-            alt.Chart(df)
-            .mark_line(
-                color=Default.ORANGE,
-                size=2,
+        metric: str,
+        window_size: int,
+        method: str = "mean",
+        center: bool = True,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> pl.DataFrame:
+        """Rolling statistic of a daily summary column, over the days with
+        receipts
+
+        Computed over the whole history before it is cut to
+        `start <= date < end`, so the first days of the range have full
+        windows. Cached per snapshot version.
+
+        Parameters
+        ----------
+        metric : str
+            column of `daily_summary`, e.g. "total_gross"
+        window_size : int
+            number of days in the window, or the span of the EWMA
+        method : str
+            "mean", "median" or "ewma", see `ROLLING_METHODS`
+        center : bool
+            whether the window is centered on the day, rather than
+            trailing it. EWMAs always trail.
+        """
+        if method not in ROLLING_METHODS:
+            raise ValueError(f"unknown rolling method: {method}")
+        if method == "ewma":
+            center = False
+
+        def compute() -> pl.DataFrame:
+            value = pl.col(metric)
+            match method:
+                case "mean":
+                    value = value.rolling_mean(
+                        window_size, min_samples=1, center=center
+                    )
+                case "median":
+                    value = value.rolling_median(
+                        window_size, min_samples=1, center=center
+                    )
+                case "ewma":
+                    value = value.ewm_mean(span=window_size, adjust=False)
+
+            df = DATABASE.fetch_daily_summary(columns=["date", metric]).select(
+                pl.col("date").alias("timestamp"),
+                value.alias("value"),
+                pl.lit(window_size).alias("window_size"),
             )
-            .transform_window(
-                rolling_mean="mean(total_gross)",
-                frame=[-window_size // 2, window_size // 2],
+            if start is not None:
+                df = df.filter(pl.col("timestamp") >= start)
+            if end is not None:
+                df = df.filter(pl.col("timestamp") < end)
+            return df
+
+        return DATABASE.cached(
+            "rolling", [metric, window_size, method, center, start, end], compute
+        )
+
+    @classmethod
+    def _rolling_lines(
+        cls,
+        metric: str,
+        window_sizes: tuple[int, ...],
+        method: str,
+        center: bool,
+        start: Optional[date],
+        end: Optional[date],
+    ) -> alt.Chart:
+        frames = [
+            cls.rolling(metric, window_size, method, center, start, end)
+            for window_size in window_sizes
+        ]
+        data = pl.concat(frames) if frames else pl.DataFrame()
+        return (
+            alt.Chart(data)
+            .mark_line(size=2)
+            .encode(
+                alt.X("timestamp:T"),
+                alt.Y("value:Q").title(f"Rolling {method}"),
+                alt.Color("window_size:O")
+                .title("Window (days)")
+                .scale(range=ROLLING_COLORS),
             )
-            .encode(alt.X("timestamp:T"), alt.Y("rolling_mean:Q"))
+        )
+
+    @classmethod
+    def daily_rolling_revenue(
+        cls,
+        window_sizes: tuple[int, ...] = (14,),
+        method: str = "mean",
+        center: bool = True,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ):
+        return cls._rolling_lines(
+            "total_gross", window_sizes, method, center, start, end
         )
 
     @classmethod
@@ -179,20 +361,14 @@ class Charts:
     @classmethod
     def daily_rolling_load_count(
         cls,
-        df: pl.DataFrame,
-        window_size: int = 14,
+        window_sizes: tuple[int, ...] = (14,),
+        method: str = "mean",
+        center: bool = True,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
     ):
-        return (
-            alt.Chart(df)
-            .mark_line(
-                color=Default.ORANGE,
-                size=2,
-            )
-            .transform_window(
-                rolling_mean="mean(full_loads)",
-                frame=[-window_size // 2, window_size // 2],
-            )
-            .encode(alt.X("timestamp:T"), alt.Y("rolling_mean:Q"))
+        return cls._rolling_lines(
+            "full_loads", window_sizes, method, center, start, end
         )
 
     @classmethod
@@ -200,18 +376,8 @@ class Charts:
         cls, 
         title: str = "Peak Hours",
     ) -> alt.Chart:
-        data = (
-            cls.receipts
-            .with_columns(
-                pl.col("timestamp").dt.weekday().alias("weekday"),
-                pl.col("timestamp").dt.hour().alias("hour"),
-            )
-            .group_by(["weekday", "hour"])
-            .agg(
-                pl.col("timestamp").first().dt.truncate("1h"),
-                pl.col("n_fold").sum().alias("load_count")
-            )
-            .sort(["weekday", "hour"])
+        data = DATABASE.fetch_hourly_weekday_summary(
+            columns=["weekday", "hour", "load_count"]
         )
 
         return (
@@ -225,7 +391,7 @@ class Charts:
                     .title(None)
                     .scale(scheme="oranges"),
                 tooltip=[
-                    alt.Tooltip("timestamp").title("Time"),
+                    alt.Tooltip("hour").title("Hour"),
                     alt.Tooltip("load_count").title("Load Count")
                 ]
             ).properties(
@@ -234,101 +400,94 @@ class Charts:
         )
 
     @classmethod
-    def daily_revenue_heatmap(cls, height: int=200):
-        _data = (
-            Stats.receipts
-            .with_columns(
-                pl.col("timestamp").dt.date(),
-            )
-            .group_by("timestamp")
-            .agg(
-                pl.col("gross_sales").sum(),
+    def calendar_options(cls, metric: str, cell_size: int = 15) -> dict:
+        """ECharts options of a calendar heatmap of a daily summary column
+
+        Every year in the data gets its own calendar and series, most
+        recent first, stacked one above the other. Cached per
+        snapshot version.
+
+        Parameters
+        ----------
+        metric : str
+            column of `daily_summary`, e.g. "total_gross"
+        cell_size : int
+            height of a day's cell, in pixels
+        """
+
+        def compute() -> dict:
+            df = (
+                DATABASE.fetch_daily_summary(columns=["date", metric])
+                .drop_nulls(metric)
+                .select(
+                    pl.col("date").dt.year().alias("year"),
+                    pl.col("date").dt.strftime("%Y-%m-%d").alias("date"),
+                    pl.col(metric),
+                )
             )
-        )
+            years = df["year"].unique().sort(descending=True).to_list()
+            year_height = cls._calendar_year_height(cell_size)
 
-        data = [
-            (row[0].strftime("%Y-%m-%d"), row[1])
-            for row in _data.iter_rows()
-        ]
+            calendars, series = [], []
+            for i, year in enumerate(years):
+                calendars.append(
+                    {
+                        "range": str(year),
+                        "top": CALENDAR_TOP + i * year_height,
+                        "cellSize": ["auto", cell_size],
+                        "left": 30,
+                        "right": 10,
+                        "itemStyle": {"borderWidth": 1},
+                    }
+                )
+                series.append(
+                    {
+                        "type": "heatmap",
+                        "coordinateSystem": "calendar",
+                        "calendarIndex": i,
+                        "data": df.filter(pl.col("year") == year)
+                        .select("date", metric)
+                        .rows(),
+                    }
+                )
+
+            return {
+                "tooltip": {"position": "top"},
+                "visualMap": {
+                    "min": df[metric].min() or 0,
+                    "max": df[metric].max() or 0,
+                    "type": "piecewise",
+                    "calculable": True,
+                    "orient": "horizontal",
+                    "left": "center",
+                    "top": "top",
+                },
+                "calendar": calendars,
+                "series": series,
+            }
+
+        return DATABASE.cached("calendar", [metric, cell_size], compute)
 
-        options = {
-            "tooltip": {"position": "top"},
-            "visualMap": {
-                "min": _data["gross_sales"].min(),
-                "max": _data["gross_sales"].max(),
-                "type": "piecewise",
-                "calculable": True,
-                "orient": "horizontal",
-                "left": "center",
-                "top": "top",
-            },
-            "calendar": {
-                "range": "2025", 
-                "cellSize": ["auto", 15],
-                "left": 30,
-                "right": 10,
-                "itemStyle": {
-                    "borderWidth": 1,
-                }
-            },
-            "series": [
-                {
-                    "type": "heatmap",
-                    "coordinateSystem": "calendar",
-                    "calendarIndex": 0,
-                    "data": data,
-                }
-            ]
-        }
-
-        return st_echarts(options, height=f"{height}px", key="echarts")
+    @staticmethod
+    def _calendar_year_height(cell_size: int) -> int:
+        # Seven rows of days, and room for the month labels
+        return 7 * cell_size + CALENDAR_YEAR_PADDING
 
     @classmethod
-    def daily_load_count_heatmap(cls, height: int=200):
-        _data = (
-            Stats.receipts
-            .with_columns(
-                pl.col("timestamp").dt.date(),
-            )
-            .group_by("timestamp")
-            .agg(
-                pl.col("n_fold").sum().alias("load_count"),
-            )
+    def calendar_heatmap(cls, metric: str, cell_size: int = 15):
+        """Render `calendar_options`, sized to the number of years"""
+        options = cls.calendar_options(metric, cell_size)
+        height = CALENDAR_TOP + len(options["calendar"]) * cls._calendar_year_height(
+            cell_size
+        )
+        return st_echarts(
+            options, height=f"{height}px", key=f"calendar_heatmap_{metric}"
         )
 
-        data = [
-            (row[0].strftime("%Y-%m-%d"), row[1])
-            for row in _data.iter_rows()
-        ]
+    @classmethod
+    def daily_revenue_heatmap(cls, cell_size: int = 15):
+        return cls.calendar_heatmap("total_gross", cell_size)
 
-        options = {
-            "tooltip": {"position": "top"},
-            "visualMap": {
-                "min": _data["load_count"].min(),
-                "max": _data["load_count"].max(),
-                "type": "piecewise",
-                "calculable": True,
-                "orient": "horizontal",
-                "left": "center",
-                "top": "top",
-            },
-            "calendar": {
-                "range": "2025", 
-                "cellSize": ["auto", 15],
-                "left": 30,
-                "right": 10,
-                "itemStyle": {
-                    "borderWidth": 1,
-                }
-            },
-            "series": [
-                {
-                    "type": "heatmap",
-                    "coordinateSystem": "calendar",
-                    "calendarIndex": 0,
-                    "data": data,
-                }
-            ]
-        }
-
-        return st_echarts(options, height=f"{height}px", key="echarts")
\ No newline at end of file
+    @classmethod
+    def daily_load_count_heatmap(cls, cell_size: int = 15):
+        return cls.calendar_heatmap("load_count", cell_size)
@@ -0,0 +1,164 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+import polars as pl
+
+
+QUERY_LOG = Path(__file__).parent / "db" / "logs" / "queries.jsonl"
+
+# Queries slower than this have their profile logged, in milliseconds
+SLOW_QUERY_MS = float(os.environ.get("CLEANNEST_SLOW_QUERY_MS", 500))
+
+# Whether queries are profiled, so that slow queries are logged with their
+# plan. Off by default, profiling adds to the cost of every query.
+PROFILE_QUERIES = os.environ.get("CLEANNEST_PROFILE_QUERIES", "0") == "1"
+
+# Fraction of fast cache hits that are logged. Hits are most of the calls
+# and cost next to nothing, the sampled ones are logged with a `weight` so
+# that call counts and hit rates stay unbiased.
+HIT_SAMPLE_RATE = float(os.environ.get("CLEANNEST_HIT_SAMPLE_RATE", 0.01))
+
+_ROOT = Path(__file__).parent.parent
+
+_LOG_SCHEMA = {
+    "logged_at": pl.String,
+    "page": pl.String,
+    "sql": pl.String,
+    "params": pl.String,
+    "duration_ms": pl.Float64,
+    "rows": pl.Int64,
+    "cached": pl.Boolean,
+    "profile": pl.String,
+    "weight": pl.Float64,
+}
+
+
+def _logger(path: Path = QUERY_LOG) -> logging.Logger:
+    """The query logger, whose records are written to `path` by a
+    background thread so that queries never wait on the file"""
+    logger = logging.getLogger("cleannest.queries")
+    if not logger.handlers:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=5 * 2**20, backupCount=5)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, handler)
+        listener.start()
+        # Flush the queued records on exit
+        atexit.register(listener.stop)
+
+        logger.addHandler(QueueHandler(records))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def calling_page() -> str:
+    """The page script, or the dashboard, that issued the current query"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        fp = Path(frame.f_code.co_filename)
+        if fp.parent == _ROOT and fp.name == "dashboard.py":
+            return fp.name
+        if _ROOT / "pages" in fp.parents:
+            return fp.relative_to(_ROOT).as_posix()
+        frame = frame.f_back
+    return "unknown"
+
+
+def log_query(
+    sql: str,
+    params: list | None,
+    duration_ms: float,
+    rows: int | None = None,
+    cached: bool = False,
+    profile: str | None = None,
+    page: str | None = None,
+) -> None:
+    """Append one query to the rotating JSONL log
+
+    Fast cache hits are only logged for a `HIT_SAMPLE_RATE` sample of calls.
+    """
+    weight = 1.0
+    if cached and duration_ms < SLOW_QUERY_MS:
+        if random.random() >= HIT_SAMPLE_RATE:
+            return
+        weight = 1 / HIT_SAMPLE_RATE
+
+    record = {
+        "logged_at": datetime.now().isoformat(timespec="milliseconds"),
+        "page": page or calling_page(),
+        "sql": normalize_sql(sql),
+        "params": json.dumps(params or [], default=str),
+        "duration_ms": round(duration_ms, 3),
+        "rows": rows,
+        "cached": cached,
+        "profile": profile,
+        "weight": weight,
+    }
+    _logger().info(json.dumps(record))
+
+
+def read_query_log(path: Path = QUERY_LOG) -> pl.DataFrame:
+    """Read the log, along with the files it was rotated to"""
+    files = [path, *path.parent.glob(f"{path.name}.*")]
+    logs = [
+        pl.read_ndjson(fp, schema=_LOG_SCHEMA)
+        for fp in files
+        if fp.exists() and fp.stat().st_size > 0
+    ]
+    return pl.concat(logs) if logs else pl.DataFrame(schema=_LOG_SCHEMA)
+
+
+def query_stats(log: pl.DataFrame) -> pl.DataFrame:
+    """Aggregate the log by query
+
+    Calls are counted by their `weight`, to make up for the sampled cache
+    hits, see `log_query`.
+
+    Columns
+    -------
+    n_calls : float
+        estimated number of times the query ran, from the cache or not
+    cache_hit_rate : float
+        fraction of calls answered by the query cache
+    mean_ms, p95_ms, max_ms : float
+        latency of the calls that ran in DuckDB
+    pages : list[str]
+        pages that issued the query
+    profile : str
+        latest profile of the query, if it was ever slow
+    """
+    # Records from before sampling weigh one call
+    weight = pl.col("weight").fill_null(1.0)
+    return (
+        log.group_by("sql")
+        .agg(
+            weight.sum().alias("n_calls"),
+            (weight.filter(pl.col("cached")).sum() / weight.sum()).alias(
+                "cache_hit_rate"
+            ),
+            pl.col("duration_ms").filter(~pl.col("cached")).mean().alias("mean_ms"),
+            pl.col("duration_ms")
+            .filter(~pl.col("cached"))
+            .quantile(0.95)
+            .alias("p95_ms"),
+            pl.col("duration_ms").max().alias("max_ms"),
+            pl.col("page").unique().sort().alias("pages"),
+            pl.col("profile").drop_nulls().last().alias("profile"),
+        )
+    )
@@ -0,0 +1,257 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import duckdb
+import polars as pl
+
+
+# Queries aggregating receipts into each summary table, `{where}` selects
+# the receipts to aggregate
+SUMMARY_TABLES = {
+    "daily_summary": """
+        SELECT
+            timestamp::DATE AS date,
+            day_key,
+            sum(gross_sales)::DECIMAL(18, 2) AS total_gross,
+            sum(discounts)::DECIMAL(18, 2) AS total_discounts,
+            count(*)::INTEGER AS n_receipts,
+            count(DISTINCT customer_name)::INTEGER AS unique_customers,
+            list(DISTINCT customer_name ORDER BY customer_name) AS customers,
+            count(*) FILTER (is_full_load)::INTEGER AS full_loads,
+            count(*) FILTER (is_titan)::INTEGER AS titan_runs,
+            sum(n_fold)::INTEGER AS load_count,
+            sum(n_detergent)::INTEGER AS n_detergent,
+            sum(n_fabcon)::INTEGER AS n_fabcon,
+            sum(n_bleach)::INTEGER AS n_bleach,
+            min(timestamp) AS first_visit,
+            max(timestamp) AS last_visit,
+            list(receipt_id ORDER BY timestamp) AS receipts
+        FROM receipts
+        {where}
+        GROUP BY ALL
+    """,
+    "monthly_summary": """
+        SELECT
+            date_trunc('month', timestamp)::DATE AS month_start,
+            (year(timestamp) * 12 + month(timestamp) - 1)::INTEGER AS month_index,
+            sum(gross_sales)::DECIMAL(18, 2) AS total_gross,
+            sum(discounts)::DECIMAL(18, 2) AS total_discounts,
+            count(*)::INTEGER AS n_receipts,
+            count(DISTINCT day_key)::INTEGER AS n_days,
+            sum(n_fold)::INTEGER AS load_count,
+            count(DISTINCT customer_name)::INTEGER AS unique_customers,
+            list(DISTINCT customer_name ORDER BY customer_name) AS customers
+        FROM receipts
+        {where}
+        GROUP BY ALL
+    """,
+    "hourly_weekday_summary": """
+        SELECT
+            isodow(timestamp)::INTEGER AS weekday,
+            hour(timestamp)::INTEGER AS hour,
+            count(*)::INTEGER AS n_receipts,
+            count(DISTINCT day_key)::INTEGER AS n_days,
+            sum(n_fold)::INTEGER AS load_count,
+            sum(gross_sales)::DECIMAL(18, 2) AS total_gross
+        FROM receipts
+        {where}
+        GROUP BY ALL
+    """,
+    "customer_summary": """
+        SELECT
+            customer_name,
+            sum(gross_sales)::DECIMAL(18, 2) AS total_spent,
+            avg(gross_sales) AS mean_transaction_value,
+            sum(discounts)::DECIMAL(18, 2) AS total_discount,
+            sum(n_fold)::INTEGER AS total_loads,
+            count(*)::INTEGER AS n_transactions,
+            -- Transactions with a service, not only an add-on
+            count(*) FILTER (gross_sales > 100)::INTEGER AS n_service_transactions,
+            min(timestamp) AS first_visit,
+            max(timestamp) AS last_visit,
+            list(
+                DISTINCT strftime(timestamp, '%Y-%m-%d')
+                ORDER BY strftime(timestamp, '%Y-%m-%d')
+            ) AS visits,
+            date_trunc('month', min(timestamp))::DATE AS cohort_month,
+            (year(min(timestamp)) * 12 + month(min(timestamp)) - 1)::INTEGER
+                AS cohort_month_index
+        FROM receipts
+        {where}
+        GROUP BY customer_name
+    """,
+}
+
+
+# Key column of the summary tables that are maintained by recomputing
+# their affected rows, and its expression over receipts
+SUMMARY_KEYS = {
+    "daily_summary": ("day_key", "day_key"),
+    "monthly_summary": ("month_start", "date_trunc('month', timestamp)::DATE"),
+    "customer_summary": ("customer_name", "customer_name"),
+}
+
+
+def _tables(con: duckdb.DuckDBPyConnection) -> set[str]:
+    return {res[0] for res in con.execute("SHOW TABLES").fetchall()}
+
+
+def summaries_exist(con: duckdb.DuckDBPyConnection) -> bool:
+    return set(SUMMARY_TABLES) <= _tables(con)
+
+
+def build_summaries(con: duckdb.DuckDBPyConnection) -> None:
+    """Rebuild every summary table from the receipts
+
+    Transactions are left to the caller.
+    """
+    for tablename, query in SUMMARY_TABLES.items():
+        con.execute(
+            f"CREATE OR REPLACE TABLE {tablename} AS {query.format(where='')}"
+        )
+
+
+def _hourly_contribution(con: duckdb.DuckDBPyConnection, tablename: str) -> None:
+    # Hourly totals of the touched days only. Days don't overlap, so the
+    # totals of the table are the sums of every day's contribution.
+    where = "WHERE day_key IN (SELECT day_key FROM _touched_receipts)"
+    query = SUMMARY_TABLES["hourly_weekday_summary"].format(where=where)
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {tablename} AS {query}")
+
+
+@contextmanager
+def maintain_summaries(
+    con: duckdb.DuckDBPyConnection, changes: pl.DataFrame | None
+) -> Iterator[None]:
+    """Keep the summary tables up to date while receipts are written
+
+    Wrap the statements that upsert or delete the receipts in `changes`.
+    Every day, month and customer of these receipts, before or after the
+    write, is recomputed. The hourly totals are adjusted by the
+    difference in the touched days' contributions. The cost depends on
+    the size of the batch, not on the history.
+
+    Summary tables that don't exist yet are built from scratch.
+    Transactions are left to the caller.
+
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection
+        connection that writes the receipts
+    changes : Optional[pl.DataFrame]
+        the written receipts, with `receipt_id`, `timestamp`, `day_key`
+        and `customer_name` columns, including cancelled receipts
+    """
+    if not summaries_exist(con):
+        yield
+        if "receipts" in _tables(con):
+            build_summaries(con)
+        return
+
+    if changes is None or changes.is_empty():
+        yield
+        return
+
+    columns = ["receipt_id", "timestamp", "day_key", "customer_name"]
+    con.register("_receipt_changes", changes.select(columns).to_arrow())
+    try:
+        # Rows of the receipts before the write, and of the batch
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE _touched_receipts AS
+            SELECT timestamp, day_key, customer_name FROM _receipt_changes
+            UNION ALL
+            SELECT timestamp, day_key, customer_name
+            FROM receipts
+            WHERE receipt_id IN (SELECT receipt_id FROM _receipt_changes)
+        """)
+        _hourly_contribution(con, "_hourly_before")
+
+        yield
+
+        for tablename, (key, expr) in SUMMARY_KEYS.items():
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE _touched_keys AS
+                SELECT DISTINCT {expr} AS key FROM _touched_receipts
+            """)
+            con.execute(f"""
+                DELETE FROM {tablename}
+                WHERE {key} IN (SELECT key FROM _touched_keys)
+                    OR ({key} IS NULL AND EXISTS (
+                        SELECT 1 FROM _touched_keys WHERE key IS NULL
+                    ))
+            """)
+            where = f"WHERE {expr} IN (SELECT key FROM _touched_keys)"
+            if tablename == "customer_summary":
+                where += """
+                    OR (customer_name IS NULL AND EXISTS (
+                        SELECT 1 FROM _touched_keys WHERE key IS NULL
+                    ))
+                """
+            query = SUMMARY_TABLES[tablename].format(where=where)
+            con.execute(f"INSERT INTO {tablename} BY NAME {query}")
+
+        _hourly_contribution(con, "_hourly_after")
+        con.execute("""
+            CREATE OR REPLACE TABLE hourly_weekday_summary AS
+            SELECT
+                weekday,
+                hour,
+                sum(n_receipts)::INTEGER AS n_receipts,
+                sum(n_days)::INTEGER AS n_days,
+                sum(load_count)::INTEGER AS load_count,
+                sum(total_gross)::DECIMAL(18, 2) AS total_gross
+            FROM (
+                FROM hourly_weekday_summary
+                UNION ALL BY NAME
+                FROM _hourly_after
+                UNION ALL BY NAME
+                SELECT
+                    weekday,
+                    hour,
+                    -n_receipts AS n_receipts,
+                    -n_days AS n_days,
+                    -load_count AS load_count,
+                    -total_gross AS total_gross
+                FROM _hourly_before
+            )
+            GROUP BY ALL
+            HAVING sum(n_receipts) > 0
+        """)
+    finally:
+        con.unregister("_receipt_changes")
+        for tablename in [
+            "_touched_receipts",
+            "_touched_keys",
+            "_hourly_before",
+            "_hourly_after",
+        ]:
+            con.execute(f"DROP TABLE IF EXISTS {tablename}")
+
+
+def _normalize(df: pl.DataFrame) -> pl.DataFrame:
+    # Compare lists as sorted strings, and averages up to rounding errors
+    return df.with_columns(
+        pl.col(pl.List(pl.String)).list.sort().list.join(","),
+        pl.col(pl.Float64).round(6),
+    )
+
+
+def check_summaries(con: duckdb.DuckDBPyConnection) -> dict[str, int]:
+    """Compare every summary table with a full recompute
+
+    Returns
+    -------
+    dict[str, int]
+        number of rows that differ, by table
+    """
+    mismatches = {}
+    for tablename, query in SUMMARY_TABLES.items():
+        expected = con.execute(query.format(where="")).pl()
+        actual = con.execute(f"FROM {tablename}").pl().select(expected.columns)
+
+        expected, actual = _normalize(expected), _normalize(actual)
+        mismatches[tablename] = sum(
+            left.join(right, on=left.columns, how="anti", nulls_equal=True).height
+            for left, right in [(expected, actual), (actual, expected)]
+        )
+    return mismatches
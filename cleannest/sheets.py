@@ -0,0 +1,111 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+import duckdb
+import polars as pl
+import pyarrow as pa
+
+
+# Expense sheets are `capital_expenses` plus one sheet per month, e.g. `Sep2025`
+EXPENSE_SHEET_PATTERN = r"capital_expenses|[A-Za-z]+\d{4}"
+
+
+class SheetSource(Protocol):
+    def sheet_names(self) -> list[str]: ...
+
+    def read(self, sheet_name: str) -> pa.Table: ...
+
+
+class GoogleSheetSource:
+    """Reads sheets from a Google Sheets spreadsheet
+
+    The DuckDB gsheets extension is loaded and authenticated once, on a
+    connection owned by this source. Each read runs on its own cursor,
+    so sheets can be fetched from several threads at once.
+    """
+
+    def __init__(self, url: str, credentials: Path):
+        credentials = Path(credentials)
+        if not credentials.exists():
+            raise FileNotFoundError(credentials)
+
+        self.url = url
+        self.credentials = credentials
+        self.con = duckdb.connect()
+        self.con.execute("INSTALL gsheets FROM community")
+        self.con.execute("LOAD gsheets")
+        self.con.execute(f"""
+            CREATE SECRET (
+                TYPE gsheet,
+                PROVIDER key_file,
+                FILEPATH '{credentials}'
+            )
+        """)
+
+    def sheet_names(self) -> list[str]:
+        import gspread
+
+        client = gspread.service_account(filename=self.credentials)
+        return [ws.title for ws in client.open_by_url(self.url).worksheets()]
+
+    def read(self, sheet_name: str) -> pa.Table:
+        # Without a range, the extension reads the sheet's used range
+        return (
+            self.con.cursor()
+            .execute(
+                "FROM read_gsheet(?, header = true, sheet = ?)",
+                [self.url, sheet_name],
+            )
+            .fetch_arrow_table()
+        )
+
+
+class LocalSheetSource:
+    """Serves sheets from `<sheet_name>.csv` files in a directory
+
+    A stand-in for Google Sheets, e.g. for fixture data or offline syncs.
+    Values are read as strings, the same as the gsheets extension.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def sheet_names(self) -> list[str]:
+        return sorted(fp.stem for fp in self.directory.glob("*.csv"))
+
+    def read(self, sheet_name: str) -> pa.Table:
+        fp = self.directory / f"{sheet_name}.csv"
+        return pl.read_csv(fp, has_header=True, infer_schema=False).to_arrow()
+
+
+def fetch_sheets(
+    source: SheetSource,
+    pattern: str = EXPENSE_SHEET_PATTERN,
+    max_workers: int = 8,
+) -> dict[str, pl.DataFrame]:
+    """Fetch every sheet whose name matches `pattern`, concurrently
+
+    Parameters
+    ----------
+    source : SheetSource
+        where to read the sheets from
+    pattern : str
+        regular expression that sheet names must fully match
+    max_workers : int
+        maximum number of sheets to fetch at once
+
+    Returns
+    -------
+    dict[str, pl.DataFrame]
+        sheet contents keyed by sheet name, in the source's sheet order
+    """
+    names = [name for name in source.sheet_names() if re.fullmatch(pattern, name)]
+    if not names:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as pool:
+        tables = list(pool.map(source.read, names))
+
+    return {name: pl.from_arrow(table) for name, table in zip(names, tables)}
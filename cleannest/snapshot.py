@@ -0,0 +1,34 @@
+import duckdb
+
+
+SNAPSHOT_TABLE = "data_snapshot"
+
+
+def snapshot_version(con: duckdb.DuckDBPyConnection) -> int:
+    """Version of the data in the database, 0 if it was never bumped"""
+    try:
+        version = con.execute(f"SELECT max(version) FROM {SNAPSHOT_TABLE}").fetchone()
+    except duckdb.CatalogException:
+        return 0
+    return version[0] or 0
+
+
+def bump_snapshot_version(con: duckdb.DuckDBPyConnection) -> int:
+    """Record that the data changed, invalidating cached query results
+
+    Run it in the same transaction as the write, so readers never see new
+    data under an old version.
+    """
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+            version BIGINT,
+            updated_at TIMESTAMP
+        )
+    """)
+    version = snapshot_version(con) + 1
+    con.execute(f"DELETE FROM {SNAPSHOT_TABLE}")
+    con.execute(
+        f"INSERT INTO {SNAPSHOT_TABLE} VALUES (?, current_localtimestamp())",
+        [version],
+    )
+    return version
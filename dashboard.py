@@ -21,6 +21,7 @@ pages = {
     ],
     "Database": [
         st.Page("pages/database.py", title="Database Explorer"),
+        st.Page("pages/diagnostics.py", title="Query Diagnostics"),
     ],
 }
 
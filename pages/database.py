@@ -1,28 +1,91 @@
-from pathlib import Path
-import streamlit as st
-import duckdb
-
+import math
 
-@st.cache_resource
-def connect_db():
-    db_path = Path(__file__).parent.parent / "cleannest" / "db" / "main.db"
-    con = duckdb.connect(db_path)
-    return con
+import streamlit as st
+from cleannest.database import CleannestDatabase
 
 
-def retrieve_data(con, table_name):
-    return con.sql(f"SELECT * FROM {table_name}").pl()
+FILTER_OPERATORS = ["contains", "=", "!=", "<", "<=", ">", ">="]
+PAGE_SIZES = [50, 100, 500, 1000]
 
 
 "# Database Explorer"
 
 # Connect to database
-con = connect_db()
+db = CleannestDatabase()
 
 # Extract table names fromm database
-tables = [res[0] for res in con.sql("SHOW TABLES").fetchall()]
+tables = db.list_tables()
 
 with st.container(horizontal=False, horizontal_alignment="center"):
     table_select = st.selectbox(label="Select table", options=tables, index=0)
-    df = retrieve_data(con, table_select)
-    st.dataframe(df)
+    columns = db.fetch_table_columns(table_select)
+    column_names = columns["column_name"].to_list()
+
+    # Row count from the table's metadata, views have to be counted. The
+    # metadata may still count deleted rows.
+    n_rows = db.estimated_row_count(table_select)
+    if n_rows is None:
+        n_rows = db.count_rows(table_select)
+
+    with st.container(horizontal=True, border=True):
+        st.metric(label="Rows", value=f"{n_rows:,}")
+        st.metric(label="Columns", value=len(column_names))
+
+    with st.expander("Columns"):
+        st.dataframe(columns, hide_index=True, use_container_width=True)
+
+        if st.toggle("Show column statistics"):
+            sampled = n_rows > 1_000_000
+            if sampled:
+                st.caption("Statistics of a sample of 100,000 rows")
+            st.dataframe(
+                db.fetch_column_stats(
+                    table_select, sample=100_000 if sampled else None
+                ),
+                hide_index=True,
+                use_container_width=True,
+            )
+
+    with st.container(horizontal=True, border=True, vertical_alignment="bottom"):
+        sort_column = st.selectbox("Sort by", [None] + column_names)
+        descending = st.toggle("Descending", disabled=sort_column is None)
+
+        filter_column = st.selectbox("Filter column", [None] + column_names)
+        filter_op = st.selectbox(
+            "Operator", FILTER_OPERATORS, disabled=filter_column is None
+        )
+        filter_value = st.text_input("Value", disabled=filter_column is None)
+
+    filters = []
+    if filter_column is not None and filter_value:
+        filters.append((filter_column, filter_op, filter_value))
+
+    if st.toggle("Sampled preview", help="Show a random sample of 1,000 rows"):
+        st.dataframe(db.fetch_sample(table_select), use_container_width=True)
+    else:
+        try:
+            # Pages are counted exactly, so the last page is never empty
+            n_matches = db.count_rows(table_select, filters)
+        except Exception as e:
+            st.error(f"Invalid filter: {e}")
+            st.stop()
+
+        with st.container(horizontal=True, vertical_alignment="bottom"):
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+            n_pages = max(math.ceil(n_matches / page_size), 1)
+            page = st.number_input(
+                f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1
+            )
+
+        st.dataframe(
+            db.fetch_page(
+                table_select,
+                page=page - 1,
+                page_size=page_size,
+                order_by=sort_column,
+                descending=descending,
+                filters=filters,
+            ),
+            use_container_width=True,
+        )
+        st.caption(f"{n_matches:,} matching rows")
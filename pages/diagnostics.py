@@ -0,0 +1,87 @@
+import polars as pl
+import streamlit as st
+
+from cleannest.querylog import (
+    PROFILE_QUERIES,
+    QUERY_LOG,
+    SLOW_QUERY_MS,
+    query_stats,
+    read_query_log,
+)
+
+
+"# Query Diagnostics"
+
+log = read_query_log()
+if log.is_empty():
+    st.info(f"No queries logged yet in `{QUERY_LOG}`")
+    st.stop()
+
+with st.container(horizontal=True, border=True, vertical_alignment="bottom"):
+    pages = st.multiselect("Filter by page", log["page"].unique().sort())
+    top_n = st.number_input("Top N", min_value=1, max_value=100, value=10)
+
+if pages:
+    log = log.filter(pl.col("page").is_in(pages))
+
+stats = query_stats(log)
+
+# Cache hits are sampled, each logged hit stands for `weight` calls
+weight = log["weight"].fill_null(1.0)
+n_calls = weight.sum()
+
+with st.container(horizontal=True, horizontal_alignment="distribute"):
+    st.metric(label="Queries", value=f"{n_calls:,.0f}", border=True)
+    st.metric(
+        label="Cache Hit Rate",
+        value=f"{weight.filter(log['cached']).sum() / n_calls:.2%}",
+        border=True,
+    )
+    st.metric(
+        label=f"Slow Queries (> {SLOW_QUERY_MS:,.0f} ms)",
+        value=f"{log.filter(pl.col('duration_ms') > SLOW_QUERY_MS).height:,}",
+        border=True,
+    )
+
+column_config = {
+    "sql": st.column_config.TextColumn("Query", width="large"),
+    "n_calls": st.column_config.NumberColumn("Calls", format="%.0f"),
+    "cache_hit_rate": st.column_config.ProgressColumn(
+        "Cache Hits", min_value=0, max_value=1, format="percent"
+    ),
+    "mean_ms": st.column_config.NumberColumn("Mean (ms)", format="%.1f"),
+    "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+    "max_ms": st.column_config.NumberColumn("Max (ms)", format="%.1f"),
+    "pages": st.column_config.ListColumn("Pages"),
+}
+
+"## Slowest Queries"
+
+slowest = stats.sort("max_ms", descending=True).head(top_n)
+st.dataframe(
+    slowest.drop("profile"),
+    hide_index=True,
+    use_container_width=True,
+    column_config=column_config,
+)
+
+"## Most Frequent Queries"
+
+st.dataframe(
+    stats.sort("n_calls", descending=True).head(top_n).drop("profile"),
+    hide_index=True,
+    use_container_width=True,
+    column_config=column_config,
+)
+
+"## Profiles"
+
+profiled = slowest.filter(pl.col("profile").is_not_null())
+if not PROFILE_QUERIES:
+    st.caption("Set `CLEANNEST_PROFILE_QUERIES=1` to log the plans of slow queries")
+elif profiled.is_empty():
+    st.caption(f"No query took longer than {SLOW_QUERY_MS:,.0f} ms")
+
+for sql, max_ms, profile in profiled.select("sql", "max_ms", "profile").iter_rows():
+    with st.expander(f"{max_ms:,.0f} ms · {sql[:120]}"):
+        st.code(profile, language=None)
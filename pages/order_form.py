@@ -4,22 +4,20 @@ TODO
 - [ ] 
 """
 
+from datetime import date
+
 import polars as pl
 import streamlit as st
-from cleannest.models import Customer, Order
-from cleannest.ingestion import item_list
+from cleannest.models import Customer, Item, Order
 from cleannest.database import CleannestDatabase
 from cleannest.components.OrderForm import OrderForm
 
 db = CleannestDatabase()
-items = db.fetch_items()
+item_frame = db.fetch_items()
 clients = db.fetch_customers()
 
-if "orders" not in st.session_state:
-    st.session_state["orders"] = []
-
 def process_order() -> None:    
-    item_map = {item.name: item for item in item_list()}
+    item_map = {item["name"]: Item(**item) for item in item_frame.to_dicts()}
     order = {}
     
     items = []
@@ -32,20 +30,20 @@ def process_order() -> None:
             items.append(item_map["Extra TITAN Dry"])
     else:
         if "Wash" in st.session_state.services:
-            items.append(item_map["Regular Wash"])
+            items.append(item_map["Wash"])
         if "Dry" in st.session_state.services:
-            items.append(item_map["Regular Dry"])
+            items.append(item_map["Dry"])
         if "Extra Dry"in st.session_state.extras:
-            items.append(item_map["Extra Regular Dry"])
+            items.append(item_map["Extra Dry"])
         
     if "Fold" in st.session_state.services:
         items.append(item_map["Fold"])
 
     for _ in range(st.session_state.n_detergent):
-        items.append(item_map["Ariel Detergent"])
+        items.append(item_map["Ariel Liquid Detergent"])
 
     for _ in range(st.session_state.n_fabcon):
-        items.append(item_map["Downey Fabcon"])
+        items.append(item_map["Downy Fabcon"])
 
     for _ in range(st.session_state.n_bleach):
         items.append(item_map["Zonrox Colorsafe Bleach"])
@@ -63,21 +61,31 @@ def process_order() -> None:
 
     order["customer"] = customer
 
-    st.session_state.orders.append(Order(**order))
-
-def tabulate_orders(orders: list[Order]):
-    data = [o.to_dict() for o in orders]
-    df = pl.DataFrame(data)
+    # Written in the background, batched with other tablets' orders
+    try:
+        db.submit_order(Order(**order)).result(timeout=10)
+    except TimeoutError:
+        # Still queued, the writer may yet commit it
+        st.warning(
+            f"Order for {customer.name} is still pending, "
+            "check the orders below before entering it again"
+        )
+    except Exception as e:
+        st.error(f"Order was not saved: {e}")
+    else:
+        st.toast(f"Saved order for {customer.name}")
 
-    return st.data_editor(
-        df,
-        num_rows="dynamic",
+def tabulate_orders(orders: pl.DataFrame):
+    return st.dataframe(
+        orders,
+        column_order=["timestamp", "customer_name", "description", "gross_sales"],
         column_config={
-            "customer": st.column_config.TextColumn(label="Customer"),
-            "created_at": st.column_config.DatetimeColumn(label="Timestamp"),
-            "items": st.column_config.ListColumn("Items"),
-            "total": st.column_config.NumberColumn("Total")
-        }
+            "customer_name": st.column_config.TextColumn(label="Customer"),
+            "timestamp": st.column_config.DatetimeColumn(label="Timestamp"),
+            "description": st.column_config.TextColumn("Items"),
+            "gross_sales": st.column_config.NumberColumn("Total")
+        },
+        hide_index=True,
     )
 
 OrderForm(
@@ -85,4 +93,4 @@ OrderForm(
     process_order
 )
 
-tabulate_orders(st.session_state.orders)
\ No newline at end of file
+tabulate_orders(db.fetch_orders(start=date.today()))
\ No newline at end of file
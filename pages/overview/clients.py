@@ -9,27 +9,30 @@ def load_db():
     return CleannestDatabase()
 
 db = load_db()
-customers_df = db.fetch_customers()
-receipts_df = db.fetch_receipts()
+customers_df = db.fetch_customers(
+    columns=["customer_id", "customer_name", "phone", "address"]
+)
+customer_summary_df = db.fetch_customer_summary(
+    columns=[
+        "customer_name",
+        "total_spent",
+        "mean_transaction_value",
+        "total_discount",
+        "total_loads",
+        "n_transactions",
+        "last_visit",
+        "first_visit",
+        "visits",
+    ]
+)
 
 
 "# Clients"
 
 df = (
-    receipts_df
-    .group_by("customer_name")
-    .agg(
-        pl.col("gross_sales").sum().alias("total_spent"),
-        pl.col("gross_sales").mean().alias("mean_transaction_value"),
-        pl.col("discounts").sum().alias("total_discount"),
-        pl.col("n_fold").sum().alias("total_loads"),
-        pl.count().alias("n_transactions"),
-        pl.col("timestamp").max().alias("last_visit"),
-        pl.col("timestamp").min().alias("first_vist"),
-        pl.col("timestamp").dt.strftime("%Y-%m-%d").unique().alias("visits"),
-    )
+    customer_summary_df
     .with_columns(
-        (pl.col("last_visit") - pl.col("first_vist")) \
+        (pl.col("last_visit") - pl.col("first_visit")) \
             .dt.total_days().alias("tenure"),
         (pl.col("total_spent") - pl.col("total_discount")) \
             .alias("lifetime_value"),
@@ -1,5 +1,6 @@
+from datetime import timedelta
+
 from cleannest.database import CleannestDatabase
-import polars as pl
 import streamlit as st
 
 
@@ -9,49 +10,44 @@ def load_db():
     return CleannestDatabase()
 
 db = load_db()
-receipts = db.fetch_receipts().sort("timestamp", descending=True)
-
-receipts = (
-    receipts
-    .select(
-        "timestamp",
-        "receipt_id",
-        "gross_sales",
-        "discounts",
-        "total_collected",
-        "customer_name",
-        "description",
-        "payment_type",
-        "cashier_name",
-    )
-)
+_min_date, _max_date = db.fetch_receipt_date_range()
 
 "# Transactions"
 
 with st.container(horizontal=True, border=True):
-    customer_list = receipts['customer_name'].unique()
+    customer_list = db.fetch_receipts(columns=["customer_name"], distinct=True)[
+        "customer_name"
+    ].sort()
     selected_customers = st.multiselect("Filter by customer", options=customer_list, default=None)
 
     _start, _end = st.date_input(
         "Filter by date",
         (
-            receipts['timestamp'].min(), 
-            receipts['timestamp'].max()
+            _min_date,
+            _max_date,
         ),
     )
 
-filters = []
-if len(selected_customers) > 0:
-    filters.append(
-        pl.col("customer_name").is_in(selected_customers)
-    )
-
-if _start and _end:
-    filters.append(pl.col("timestamp") >= _start)
-    filters.append(pl.col("timestamp") <= _end)
+# Filter in the database, the end date is inclusive
+receipts = db.fetch_receipts(
+    start=_start or None,
+    end=_end + timedelta(days=1) if _end else None,
+    columns=[
+        "timestamp",
+        "receipt_id",
+        "gross_sales",
+        "discounts",
+        "total_collected",
+        "customer_name",
+        "description",
+        "payment_type",
+        "cashier_name",
+    ],
+    customers=selected_customers or None,
+).sort("timestamp", descending=True)
 
 st.dataframe(
-    receipts.filter(*filters),
+    receipts,
     use_container_width=True,
     height=600,
 )
\ No newline at end of file
@@ -1,72 +1,53 @@
-from pathlib import Path
 from datetime import date
-import duckdb
 import polars as pl
 import streamlit as st
 import altair as alt
+from cleannest.database import CleannestDatabase
+from cleannest.plotting import altair_chart
 
 
-@st.cache_resource
-def connect_db():
-    db_path = Path(__file__).parent.parent.parent / "cleannest" / "db" / "main.db"
-    con = duckdb.connect(db_path)
-    return con
+db = CleannestDatabase()
+customers_df = db.fetch_customers(columns=["customer_id"])
+monthly_df = db.fetch_monthly_summary(
+    columns=["month_start", "total_gross", "n_receipts"]
+)
+daily_df = db.fetch_daily_summary(columns=["date", "total_gross"])
+expenses_df = db.query("SELECT date, total_cost FROM expenses")
+dim_date_df = db.fetch_dim_date(columns=["date", "month_start"])
 
 
-con = connect_db()
-customers_df = con.sql("FROM customers").pl()
-receipts_df = con.sql("FROM receipts").pl()
-expenses_df = con.sql("FROM expenses").pl()
+def sort_by_month(df, dt_col, metric_col, metric="sum", on="date") -> pl.DataFrame:
+    """Aggregate by month and compute a summary metric
 
+    The month of each row is looked up in `dim_date` by joining on `on`,
+    and returned in the `dt_col` column.
+    """
+    months = dim_date_df.select(on, "month_start")
+    grouped = df.join(months, on=on).group_by(pl.col("month_start").alias(dt_col))
 
-def sort_by_month(df, dt_col, metric_col, metric="sum") -> pl.DataFrame:
-    """Aggregate by month and compute a summary metric"""
     if metric == "sum":
-        res = (
-            df.with_columns(
-                pl.col(dt_col).dt.truncate("1mo"),
-            )
-            .group_by(dt_col)
-            .agg(
-                pl.col(metric_col).sum(),
-            )
-            .sort(dt_col)
-        )
+        res = grouped.agg(pl.col(metric_col).sum())
     elif metric == "mean":
-        res = (
-            df.with_columns(pl.col(dt_col).dt.truncate("1mo"))
-            .group_by(dt_col)
-            .agg(
-                pl.col(metric_col).mean(),
-            )
-            .sort(dt_col)
-        )
+        res = grouped.agg(pl.col(metric_col).mean())
     elif metric == "median":
-        res = (
-            df.with_columns(pl.col(dt_col).dt.truncate("1mo"))
-            .group_by(dt_col)
-            .agg(
-                pl.col(metric_col).median(),
-            )
-            .sort(dt_col)
-        )
+        res = grouped.agg(pl.col(metric_col).median())
 
-    return res
+    return res.sort(dt_col)
 
 
 # Compute revenue metrics
-mean_monthly_revenue = sort_by_month(receipts_df, "timestamp", "gross_sales", "sum")
-total_revenue = receipts_df["gross_sales"].sum()
+mean_monthly_revenue = monthly_df.select(
+    pl.col("month_start").alias("timestamp"),
+    pl.col("total_gross").alias("gross_sales"),
+)
+total_revenue = monthly_df["total_gross"].sum()
 daily_revenue = (
-    receipts_df.with_columns(
-        pl.col("timestamp").dt.truncate("1mo").alias("month"),
-        pl.col("timestamp").dt.truncate("1d").alias("day"),
+    daily_df.join(dim_date_df, on="date")
+    .select(
+        pl.col("month_start").alias("month"),
+        pl.col("total_gross").alias("daily_revenue"),
     )
-    .group_by(["month", "day"])
-    .agg(
-        pl.col("gross_sales").sum().alias("daily_revenue"),
-    )
-    .group_by("month")
+    .group_by("month", maintain_order=True)
     .agg(pl.col("daily_revenue"))
     .sort("month")
 )
@@ -95,16 +76,14 @@ with st.container(border=True, horizontal=True, horizontal_alignment="center"):
     # Total transactions
     st.metric(
         label="Total Transactions",
-        value=f"{receipts_df.height:,}"
+        value=f"{monthly_df['n_receipts'].sum():,}"
     )
 
 
 "## Cash Flow"
 
 df = (
-    mean_monthly_revenue.with_columns(
-        pl.col("timestamp").dt.date(),
-    )
+    mean_monthly_revenue
     .join(mean_monthly_expense, left_on="timestamp", right_on="date")
     .with_columns(
         total_cost_neg=pl.col("total_cost") * -1,
@@ -113,33 +92,39 @@ df = (
         / pl.col("total_cost"),
     )
     .join(
-        daily_revenue.with_columns(pl.col("month").dt.date()),
+        daily_revenue,
         left_on="timestamp",
         right_on="month",
     )
 )
 
-base = alt.Chart(df).encode(
-    alt.X("yearmonth(timestamp):O").title("Date")
-)
 
-sales_chart = base.mark_bar(color="seagreen", opacity=0.9).encode(
-    alt.Y("gross_sales").title("")
-)
-expense_chart = base.mark_bar(color="firebrick", opacity=0.9).encode(
-    alt.Y("total_cost_neg").title("")
-)
-net_gross_chart = base.mark_point(size=100, color="gray", fill="white").encode(
-    alt.Y("net_gross_amt").title("")
-)
+def revenue_expense_chart():
+    # Only the plotted columns are sent to the browser
+    base = alt.Chart(
+        df.select("timestamp", "gross_sales", "total_cost_neg", "net_gross_amt")
+    ).encode(
+        alt.X("yearmonth(timestamp):O").title("Date")
+    )
+
+    sales_chart = base.mark_bar(color="seagreen", opacity=0.9).encode(
+        alt.Y("gross_sales").title("")
+    )
+    expense_chart = base.mark_bar(color="firebrick", opacity=0.9).encode(
+        alt.Y("total_cost_neg").title("")
+    )
+    net_gross_chart = base.mark_point(size=100, color="gray", fill="white").encode(
+        alt.Y("net_gross_amt").title("")
+    )
+
+    return alt.layer(
+        sales_chart, 
+        expense_chart,
+        net_gross_chart,
+    ).configure_scale(
+        bandPaddingInner=0.15,
+    )
 
-_revenue_expense_chart = alt.layer(
-    sales_chart, 
-    expense_chart,
-    net_gross_chart,
-).configure_scale(
-    bandPaddingInner=0.15,
-)
 
 with st.container(horizontal=True, horizontal_alignment="center", width="stretch"):
     with st.container(width=300):
@@ -163,7 +148,7 @@ with st.container(horizontal=True, horizontal_alignment="center", width="stretch
             border=True,
         )
 
-    st.altair_chart(_revenue_expense_chart)
+    altair_chart("summary/revenue_expense", [], revenue_expense_chart)
 
 def color_values(val):
     if val > 0: 
@@ -7,21 +7,16 @@ import polars as pl
 import streamlit as st
 
 from cleannest.plotting import Stats
-from cleannest.plotting import Charts
+from cleannest.plotting import Charts, altair_chart
 
 "# Customers"
 
 # Churn analysis
-subset = ["timestamp", "gross_sales", "customer_name"]
-df = Stats.receipts.select(subset).with_columns(
-    pl.col("timestamp").dt.truncate("1mo").alias("year_month")
-)
 
 ## Get active customers per month
-active_customers = (
-    df.group_by("year_month")
-    .agg(pl.col("customer_name").unique().alias("customers"))
-    .sort("year_month")
+active_customers = Stats.monthly.select(
+    pl.col("month_start").alias("year_month"),
+    "customers",
 )
 
 ## Convert to lists for set operations
@@ -94,15 +89,15 @@ with st.container(horizontal=True, horizontal_alignment="distribute"):
 
 with st.container(horizontal=True, horizontal_alignment="distribute"):
     with st.container(border=True, vertical_alignment="center"):
-        customer_counts = (
-            Stats.receipts.with_columns(pl.col("timestamp").dt.truncate("1mo"))
-            .group_by("timestamp")
-            .agg(pl.col("customer_name").unique().len().alias("unique_customers"))
-            .sort("timestamp")
+        customer_counts = Stats.monthly.select(
+            pl.col("month_start").alias("timestamp"),
+            "unique_customers",
         )
 
-        st.altair_chart(
-            alt.Chart(
+        altair_chart(
+            "retention/monthly_unique_customers",
+            [],
+            lambda: alt.Chart(
                 customer_counts,
                 title=alt.Title(
                     "Monthly Unique Customers",
@@ -117,30 +112,32 @@ with st.container(horizontal=True, horizontal_alignment="distribute"):
         )
 
     with st.container(border=True, vertical_alignment="center"):
-        st.altair_chart(churn_chart)
+        altair_chart("retention/churn", [], lambda: churn_chart)
 
 "### Peak Hours"
 
-st.altair_chart(
-    Charts.peak_daily_hours(title="")
-)
+altair_chart("retention/peak_hours", [], lambda: Charts.peak_daily_hours(title=""))
 
 "### Cohort Analysis"
 
-orders = Stats.receipts.with_columns(
-    pl.col("timestamp").dt.truncate("1mo").alias("order_period")
-)
-cohort_df = orders.group_by("customer_name").agg(
-    pl.col("timestamp").min().dt.truncate("1mo").alias("cohort_period")
+# Months in which each customer placed an order
+orders = Stats.monthly.select(
+    pl.col("month_start").alias("order_period"),
+    "month_index",
+    pl.col("customers").alias("customer_name"),
+).explode("customer_name")
+cohort_df = orders.join(
+    Stats.customer_summary.select(
+        "customer_name",
+        pl.col("cohort_month").alias("cohort_period"),
+        "cohort_month_index",
+    ),
+    on="customer_name",
 )
-cohort_df = orders.join(cohort_df, on="customer_name")
 
 ## Calculate cohort idnex (months since cohort start)
 orders = cohort_df.with_columns(
-    (
-        (pl.col("order_period").dt.year() - pl.col("cohort_period").dt.year()) * 12
-        + (pl.col("order_period").dt.month() - pl.col("cohort_period").dt.month())
-    ).alias("cohort_index")
+    (pl.col("month_index") - pl.col("cohort_month_index")).alias("cohort_index")
 )
 
 # Count unique customers by cohort_period and cohort_index
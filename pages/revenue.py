@@ -1,10 +1,15 @@
+from datetime import timedelta
+
 import streamlit as st
 
-from cleannest.plotting import Charts, Stats
+from cleannest.plotting import ROLLING_METHODS, Charts, Stats, altair_chart
 from cleannest.database import CleannestDatabase
 
 
 
+WINDOW_SIZES = [7, 14, 30, 60, 90, 180]
+
+
 # Load data
 @st.cache_resource
 def load_db():
@@ -12,8 +17,7 @@ def load_db():
 
 
 db = load_db()
-customers = db.fetch_customers()
-receipts = db.fetch_receipts().sort("timestamp", descending=True)
+_min_timestamp, _max_timestamp = db.fetch_receipt_date_range()
 
 # Set page configuration
 st.set_page_config(
@@ -26,8 +30,8 @@ st.write("# Business Revenue")
 
 # st.dataframe(receipts)
 
-_min_date = receipts["timestamp"].dt.date().min()
-_max_date = receipts["timestamp"].dt.date().max()
+_min_date = _min_timestamp.date()
+_max_date = _max_timestamp.date()
 
 c1, c2, c3 = st.columns([1, 2, 1])
 
@@ -46,40 +50,53 @@ with st.container(horizontal=True, horizontal_alignment="distribute", border=Tru
             (_min_date, _max_date),
             width=500,
         )
-        window_size = st.slider(
-            label="Window Size",
-            min_value=7,
-            max_value=180,
-            value=60,
-            step=1,
-            width=100,
+        window_sizes = st.multiselect(
+            "Window sizes (days)",
+            WINDOW_SIZES,
+            default=[60],
+            width=200,
         )
+        rolling_method = st.selectbox(
+            "Rolling", ROLLING_METHODS, format_func=str.upper, width=100
+        )
+        centered = st.toggle("Centered", value=True, disabled=rolling_method == "ewma")
+
+# Queries take `start <= date < end`, the picked end date is included
+range_start, range_end = date_filter[0], date_filter[1] + timedelta(days=1)
 
-filtered_df = Charts.df(date_filter[0], date_filter[1])
+filtered_df = Charts.df(range_start, range_end)
+
+# Every metric of the KPI strip, from one query
+kpis = Stats.kpis()
+
+# Totals of the selected range, from prefix sums rather than a scan
+range_totals = db.day_index().totals(range_start, range_end)
 
 with st.container(horizontal=True, horizontal_alignment="center"):
     if selected_metric == "Revenue":
 
         # Compute delta between today's revenue and mean revenue
-        revenue_delta = (Stats.total_revenue_today() - Stats.daily_average_revenue()) / Stats.daily_average_revenue()
+        revenue_delta = (
+            kpis["total_revenue_today"] - kpis["daily_average_revenue"]
+        ) / kpis["daily_average_revenue"]
 
         st.metric(
             label="Today's Revenue (PHP)",
-            value=f"{Stats.total_revenue_today():,.2f}",
+            value=f"{kpis['total_revenue_today']:,.2f}",
             border=True,
             delta=f"{revenue_delta:.2%}",
         )
 
         st.metric(
             label="Mean Daily Revenue (PHP)",
-            value=f"{Stats.daily_average_revenue():,.2f}",
+            value=f"{kpis['daily_average_revenue']:,.2f}",
             # delta="10",
             border=True,
         )
 
         st.metric(
             label="Total Revenue (PHP)",
-            value=f"{Stats.total_revenue():,.2f}",
+            value=f"{kpis['total_revenue']:,.2f}",
             # delta="10",
             border=True,
         )
@@ -87,26 +104,26 @@ with st.container(horizontal=True, horizontal_alignment="center"):
     elif selected_metric == "Load Count":
         # Compute delta between today's load count and mean load count
         load_count_delta = (
-            Stats.total_load_count_today() - Stats.daily_average_load_count()
-        ) / Stats.daily_average_load_count()
+            kpis["total_load_count_today"] - kpis["daily_average_load_count"]
+        ) / kpis["daily_average_load_count"]
         
         st.metric(
             label="Today's Load Count",
-            value=f"{Stats.total_load_count_today()}",
+            value=f"{kpis['total_load_count_today']}",
             border=True,
             delta=f"{load_count_delta:.2%}"
         )
 
         st.metric(
             label="Mean Daily Load Count",
-            value=f"{Stats.daily_average_load_count():,.2f}",
+            value=f"{kpis['daily_average_load_count']:,.2f}",
             # delta="10",
             border=True,
         )
 
         st.metric(
             label="Total Load Count",
-            value=f"{Stats.total_load_count()}",
+            value=f"{kpis['total_load_count']}",
             # delta="10",
             border=True,
         )
@@ -115,26 +132,65 @@ with st.container(horizontal=True, horizontal_alignment="center"):
 
 with st.container(border=True, vertical_alignment="center"):
     subtitle = f"Data from {date_filter[0]} to {date_filter[1]}"
+
+    n_days = range_totals["n_days"]
+    with st.container(horizontal=True):
+        if selected_metric == "Revenue":
+            range_total = range_totals["total_gross"]
+            st.metric(label="Revenue in Range (PHP)", value=f"{range_total:,.2f}")
+        else:
+            range_total = range_totals["load_count"]
+            st.metric(label="Loads in Range", value=f"{range_total:,}")
+        st.metric(
+            label="Daily Mean in Range",
+            value=f"{range_total / n_days:,.2f}" if n_days else "-",
+        )
+        st.metric(label="Days Open", value=n_days)
+
+    # Only the plotted columns are sent, the spec is cached per range
+    chart_params = [
+        range_start,
+        range_end,
+        tuple(window_sizes),
+        rolling_method,
+        centered,
+    ]
     match selected_metric:
         case "Revenue":
-            st.altair_chart(
-                Charts.daily_total_revenue(
-                    filtered_df,
+            altair_chart(
+                "revenue/daily_revenue",
+                chart_params,
+                lambda: Charts.daily_total_revenue(
+                    filtered_df.select("timestamp", "total_gross"),
                     subtitle=subtitle,
                 )
-                + Charts.daily_rolling_revenue(filtered_df, window_size),
+                + Charts.daily_rolling_revenue(
+                    tuple(window_sizes),
+                    rolling_method,
+                    centered,
+                    range_start,
+                    range_end,
+                ),
                 use_container_width=True,
             )
 
             Charts.daily_revenue_heatmap()
 
         case "Load Count":
-            st.altair_chart(
-                Charts.daily_total_load_count(
-                    filtered_df,
+            altair_chart(
+                "revenue/daily_load_count",
+                chart_params,
+                lambda: Charts.daily_total_load_count(
+                    filtered_df.select("timestamp", "full_loads"),
                     subtitle=subtitle,
                 )
-                + Charts.daily_rolling_load_count(filtered_df, window_size)
+                + Charts.daily_rolling_load_count(
+                    tuple(window_sizes),
+                    rolling_method,
+                    centered,
+                    range_start,
+                    range_end,
+                ),
             )
 
             Charts.daily_load_count_heatmap()
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from pos_export import generate_receipts, write_receipt_exports
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    with duckdb.connect(tmp_path / "main.db") as con:
+        yield con
+
+
+@pytest.fixture
+def receipt_exports(tmp_path: Path) -> list[Path]:
+    """Monthly POS exports of a few thousand receipts, with duplicates
+    across exports and some cancelled receipts"""
+    return write_receipt_exports(generate_receipts(6_000, seed=1), tmp_path / "all")
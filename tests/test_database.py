@@ -0,0 +1,22 @@
+import polars as pl
+
+from cleannest.database import QueryCache
+
+
+def test_query_cache_ignores_older_snapshots():
+    cache = QueryCache(2**20)
+    current = QueryCache.key("FROM receipts", None, 2)
+    assert cache.get(current) is None
+    cache.put(current, pl.DataFrame({"a": [1]}))
+
+    # A reader of an older snapshot misses, without dropping newer results
+    older = QueryCache.key("FROM receipts", None, 1)
+    assert cache.get(older) is None
+    cache.put(older, pl.DataFrame({"a": [0]}))
+    assert cache.version == 2
+    assert cache.get(current)["a"].to_list() == [1]
+
+    # A newer snapshot drops every result
+    newer = QueryCache.key("FROM receipts", None, 3)
+    assert cache.get(newer) is None
+    assert len(cache) == 0
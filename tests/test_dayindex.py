@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from cleannest.dates import day_key
+from cleannest.dayindex import DAY_INDEX_COLUMNS, DayIndex
+
+
+@pytest.fixture
+def daily() -> pl.DataFrame:
+    # Every other day of two months, so ranges can start on missing days
+    rng = np.random.default_rng(0)
+    dates = pl.date_range(date(2025, 1, 1), date(2025, 2, 28), "2d", eager=True)
+    return (
+        pl.DataFrame({"date": dates})
+        .with_columns(
+            day_key("date").alias("day_key"),
+            *[
+                pl.Series(col, rng.integers(0, 50, len(dates)))
+                for col in DAY_INDEX_COLUMNS
+            ],
+        )
+        .with_columns(pl.col("total_gross") * 12.25)
+    )
+
+
+def _expected(daily: pl.DataFrame, start: date | None, end: date | None) -> dict:
+    if start is not None:
+        daily = daily.filter(pl.col("date") >= start)
+    if end is not None:
+        daily = daily.filter(pl.col("date") < end)
+    totals = {"n_days": daily.height}
+    totals.update({col: daily[col].sum() for col in DAY_INDEX_COLUMNS})
+    return totals
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (None, None),
+        (date(2025, 1, 1), date(2025, 1, 2)),
+        (date(2025, 1, 1), date(2025, 1, 3)),
+        (date(2025, 1, 2), date(2025, 1, 3)),
+        (date(2025, 1, 4), date(2025, 2, 10)),
+        (date(2024, 12, 1), date(2025, 1, 1)),
+        (date(2025, 3, 1), None),
+        (None, date(2025, 1, 15)),
+        (date(2025, 2, 1), date(2025, 1, 1)),
+    ],
+)
+def test_totals(daily: pl.DataFrame, start: date | None, end: date | None):
+    totals = DayIndex(daily).totals(start, end)
+    assert totals == pytest.approx(_expected(daily, start, end))
+
+
+def test_means_of_an_empty_range(daily: pl.DataFrame):
+    means = DayIndex(daily).means(date(2025, 1, 2), date(2025, 1, 3))
+    assert set(means.values()) == {None}
+
+
+def test_extended(daily: pl.DataFrame):
+    earlier = daily.filter(pl.col("date") < date(2025, 2, 1))
+    later = daily.filter(pl.col("date") >= date(2025, 2, 1))
+
+    index = DayIndex(earlier, version=1)
+    extended = index.extended(later, version=2)
+    assert extended.version == 2
+    assert extended.totals() == pytest.approx(_expected(daily, None, None))
+    # The original index is left as it was
+    assert index.totals() == pytest.approx(_expected(earlier, None, None))
+
+    with pytest.raises(ValueError):
+        extended.extended(earlier.tail(1), version=3)
+
+
+def test_matches(daily: pl.DataFrame):
+    index = DayIndex(daily)
+    totals = _expected(daily, None, None)
+    assert index.matches(totals)
+    assert not index.matches({**totals, "load_count": totals["load_count"] + 1})
+    assert not index.matches({**totals, "n_days": totals["n_days"] - 1})
+
+
+def test_start_dates_between_indexed_days(daily: pl.DataFrame):
+    index = DayIndex(daily)
+    first = daily["date"].min()
+    assert index.totals(first + timedelta(days=1))["n_days"] == daily.height - 1
@@ -0,0 +1,202 @@
+import os
+import shutil
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import duckdb
+import polars as pl
+import pytest
+
+from cleannest.models import Customer, Item, Order
+from cleannest.orders import write_orders
+import ingestion
+from rollups import check_summaries
+from snapshot import snapshot_version
+
+
+def _receipts(n_rows: int, start: datetime = datetime(2023, 1, 1)) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "receipt_id": [str(i) for i in range(n_rows)],
+            "timestamp": pl.datetime_range(
+                start, start + timedelta(minutes=n_rows - 1), "1m", eager=True
+            ),
+            "customer_name": "Customer 1",
+        }
+    )
+
+
+def test_write_table_upsert(con: duckdb.DuckDBPyConnection):
+    receipts = _receipts(100)
+    with ingestion.transaction(con):
+        ingestion.write_table(con, receipts, "receipts")
+
+    corrections = receipts.slice(10, 5).with_columns(customer_name=pl.lit("Customer 2"))
+    for _ in range(2):
+        with ingestion.transaction(con):
+            ingestion.write_table(
+                con, corrections, "receipts", mode="upsert", key="receipt_id"
+            )
+
+    assert con.execute("SELECT count(*) FROM receipts").fetchone() == (100,)
+    assert con.execute(
+        "SELECT count(*) FROM receipts WHERE customer_name = 'Customer 2'"
+    ).fetchone() == (5,)
+
+
+def test_recluster(con: duckdb.DuckDBPyConnection):
+    # Five row groups, sorted by timestamp
+    receipts = _receipts(500_000)
+    with ingestion.transaction(con):
+        ingestion.write_table(con, receipts, "receipts")
+    assert ingestion.clustering_disorder(con, "receipts") == 0.0
+
+    # A late correction widens the last row group only
+    correction = receipts.slice(10, 1).with_columns(customer_name=pl.lit("Customer 2"))
+    with ingestion.transaction(con):
+        ingestion.write_table(con, correction, "receipts", "upsert", "receipt_id")
+    assert ingestion.clustering_disorder(con, "receipts") > 0.0
+    assert not ingestion.recluster(con, "receipts")
+
+    # Late rows spanning several row groups are sorted in
+    late = receipts.head(300_000).with_columns(pl.col("receipt_id") + "-late")
+    with ingestion.transaction(con):
+        ingestion.write_table(con, late, "receipts", mode="append")
+    assert ingestion.recluster(con, "receipts")
+    assert ingestion.clustering_disorder(con, "receipts") == 0.0
+    assert con.execute("SELECT count(*) FROM receipts").fetchone() == (800_000,)
+
+    # The indexes are restored, and upserts keep working
+    with ingestion.transaction(con):
+        ingestion.write_table(con, correction, "receipts", "upsert", "receipt_id")
+    assert con.execute(
+        "SELECT count(*) FROM duckdb_indexes() WHERE table_name = 'receipts'"
+    ).fetchone() == (2,)
+
+
+def test_transaction_rolls_back(con: duckdb.DuckDBPyConnection):
+    con.execute("CREATE TABLE t (i INTEGER)")
+    with pytest.raises(ZeroDivisionError):
+        with ingestion.transaction(con):
+            con.execute("INSERT INTO t VALUES (1)")
+            1 / 0
+    assert con.execute("SELECT count(*) FROM t").fetchone() == (0,)
+
+
+def test_sync_receipt_data(
+    tmp_path: Path, receipt_exports: list[Path], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.chdir(tmp_path)
+    db = Path("db/main.db")
+    receipt_dir = Path("data/receipts")
+    receipt_dir.mkdir(parents=True)
+    for fp in receipt_exports[:-1]:
+        shutil.copy(fp, receipt_dir)
+    assert ingestion.sync_receipt_data(db, receipt_dir) > 0
+    assert ingestion.sync_receipt_data(db, receipt_dir) == 0
+
+    # A touched export is not parsed again, nor are cached results dropped
+    with duckdb.connect(db) as con:
+        version = snapshot_version(con)
+    touched = next(receipt_dir.glob("*.csv"))
+    os.utime(touched, (0, 0))
+    assert ingestion.sync_receipt_data(db, receipt_dir) == 0
+    with duckdb.connect(db) as con:
+        assert snapshot_version(con) == version
+        assert con.execute(
+            "SELECT mtime FROM ingest_manifest WHERE path = ?", [str(touched)]
+        ).fetchone() == (0,)
+
+    # The last export, and corrections of receipts of the first one: new
+    # customers, cancellations and receipts moved to another day
+    shutil.copy(receipt_exports[-1], receipt_dir)
+    first = pl.read_csv(receipt_exports[0], infer_schema=False)
+    cancelled = first.slice(30, 20)
+    pl.concat(
+        [
+            first.head(30).with_columns(pl.lit("Customer 99999").alias("Customer name")),
+            cancelled.with_columns(pl.lit("Cancelled").alias("Status")),
+            first.slice(50, 5).with_columns(pl.lit("2/3/25 10:15 AM").alias("Date")),
+        ]
+    ).write_csv(receipt_dir / "zz-corrections.csv")
+    ingestion.sync_receipt_data(db, receipt_dir)
+
+    with duckdb.connect(db) as con:
+        assert set(check_summaries(con).values()) == {0}
+        assert con.execute(
+            "SELECT count(*) FROM receipts WHERE receipt_id IN (SELECT unnest(?))",
+            [cancelled["Receipt number"].to_list()],
+        ).fetchone() == (0,)
+
+        # A full load of the same exports gives the same rows
+        receipts, items = ingestion.load_receipt_data()
+        assert con.execute("SELECT count(*) FROM receipts").fetchone() == (
+            receipts.height,
+        )
+        assert con.execute("SELECT count(*) FROM receipt_items").fetchone() == (
+            items.height,
+        )
+
+    # The lazy plan and the parse cache agree
+    assert receipts["timestamp"].is_sorted(descending=True)
+    cached, _ = ingestion.load_receipt_data(cache_dir=tmp_path / "cache")
+    assert receipts.sort("receipt_id").equals(cached.sort("receipt_id"))
+
+
+def test_build_dim_date_table_without_dates(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.chdir(tmp_path)
+    db = tmp_path / "main.db"
+    with duckdb.connect(db) as con:
+        con.execute("CREATE TABLE receipts (timestamp TIMESTAMP)")
+        con.execute("CREATE TABLE expenses (date DATE)")
+
+    ingestion.build_dim_date_table(db)
+    with duckdb.connect(db) as con:
+        assert con.execute(
+            "SELECT count(*) FROM dim_date WHERE date = ?", [date.today()]
+        ).fetchone() == (1,)
+
+
+def test_full_rebuild_keeps_orders(
+    tmp_path: Path, receipt_exports: list[Path], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.chdir(tmp_path)
+    db = Path("db/main.db")
+    receipt_dir = Path("data/receipts")
+    receipt_dir.mkdir(parents=True)
+    for fp in receipt_exports:
+        shutil.copy(fp, receipt_dir)
+    ingestion.sync_receipt_data(db, receipt_dir)
+
+    customer = Customer(
+        customer_id="1",
+        customer_name="Customer 1",
+        email=None,
+        phone=None,
+        address=None,
+    )
+    fold = Item(name="Fold", category="service", cost=35.0)
+    with duckdb.connect(db) as con, ingestion.transaction(con):
+        order = Order(customer=customer, items=[fold])
+        write_orders(con, [(str(uuid.uuid4()), order)])
+        version = snapshot_version(con)
+
+    # What `make sync-db` does with the receipts
+    ingestion.drop_derived_tables(db)
+    receipts, items = ingestion.load_receipt_data()
+    ingestion.df2db(receipts, db, "receipts")
+    ingestion.df2db(items, db, "receipt_items")
+    ingestion.record_ingested_files(db)
+    ingestion.build_summary_tables(db)
+
+    with duckdb.connect(db) as con:
+        assert con.execute("SELECT description FROM orders").fetchall() == [
+            ("1 x Fold",)
+        ]
+        assert con.execute("SELECT count(*) FROM order_items").fetchone() == (1,)
+        assert set(check_summaries(con).values()) == {0}
+        assert snapshot_version(con) > version
+    assert ingestion.sync_receipt_data(db, receipt_dir) == 0
@@ -0,0 +1,92 @@
+import polars as pl
+import pytest
+
+import ingestion
+from items import parse_items
+
+
+# Flags of the receipts as they were parsed before receipt_items, one
+# regex per count
+BASELINE_PATTERNS = {
+    "n_wash": r"(\d) x (TITAN )?Wash",
+    "n_dry": r"(\d) x (TITAN )?Dry",
+    "n_fold": r"(\d) x Fold",
+    "n_detergent": r"(\d) x Ariel Liquid Detergent",
+    "n_fabcon": r"(\d) x Downy Fabcon",
+    "n_bleach": r"(\d) x Zonrox Colorsafe Bleach",
+}
+
+DESCRIPTIONS = [
+    "1 x Wash, 1 x Dry, 1 x Fold, 1 x Ariel Liquid Detergent, 1 x Downy Fabcon",
+    "1 x TITAN Wash, 1 x TITAN Dry, 1 x Fold, 2 x Ariel Liquid Detergent, 2 x Downy Fabcon",
+    "1 x Wash, 1 x Ariel Liquid Detergent, 1 x Zonrox Colorsafe Bleach",
+    "2 x TITAN Wash, 2 x TITAN Dry, 2 x Fold",
+    "1 x Hand Wash, 1 x Fold",
+    "1 x Hand Wash, 1 x Regular Dry, 1 x Fold, 1 x Ariel Liquid Detergent, 1 x Downy Fabcon",
+    "1 x Wash, 1 x Dry, 1 x Extra TITAN Dry",
+    "1 x Regular Wash, 1 x Ariel Detergent",
+    "1 x Dry",
+    "Custom amount",
+]
+
+
+def _receipts(descriptions: list[str]) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "receipt_id": [str(i) for i in range(len(descriptions))],
+            "description": descriptions,
+        }
+    )
+
+
+def _item_counts(receipts: pl.DataFrame) -> pl.DataFrame:
+    items = ingestion._parse_receipt_items(receipts.lazy())
+    return ingestion._with_item_counts(receipts.lazy(), items).collect()
+
+
+def test_parse_items():
+    items = parse_items(_receipts(["2 x TITAN Wash, 1 x Fold"]), "receipt_id")
+    assert items.collect().rows() == [("0", "wash", "TITAN", 2), ("0", "fold", None, 1)]
+
+
+def test_item_counts_match_baseline():
+    receipts = _receipts(DESCRIPTIONS)
+    expected = receipts.select(
+        *[
+            pl.col("description").str.extract(pattern).fill_null(0).cast(pl.Int32).alias(name)
+            for name, pattern in BASELINE_PATTERNS.items()
+        ],
+        pl.col("description").str.contains("TITAN").alias("is_titan"),
+    )
+    actual = _item_counts(receipts).select(expected.columns)
+    assert actual.to_dicts() == expected.to_dicts()
+
+
+@pytest.mark.parametrize(
+    "description, is_full_load",
+    [
+        (DESCRIPTIONS[0], True),
+        (DESCRIPTIONS[1], True),
+        (DESCRIPTIONS[4], False),
+        (DESCRIPTIONS[5], False),
+    ],
+)
+def test_is_full_load(description: str, is_full_load: bool):
+    assert _item_counts(_receipts([description]))["is_full_load"].item() == is_full_load
+
+
+def test_quantities_are_not_capped():
+    counts = _item_counts(_receipts(["12 x Fold, 300 x Wash"]))
+    assert counts.select("n_fold", "n_wash").row(0) == (12, 300)
+
+
+def test_out_of_range_quantities_fail():
+    with pytest.raises(pl.exceptions.InvalidOperationError, match="99999999999"):
+        _item_counts(_receipts(["1 x Fold", "99999999999 x Dry"]))
+
+
+def test_catalog_items_are_counted():
+    # Orders are described with the catalog's names, as receipts are
+    names = [item.name for item in ingestion.item_list()]
+    counts = _item_counts(_receipts([", ".join(f"1 x {name}" for name in names)]))
+    assert counts.select(list(ingestion.ITEM_COUNTS)).row(0) == (2, 2, 1, 1, 1, 1)
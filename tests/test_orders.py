@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from cleannest.database import ConnectionPool
+from cleannest.models import Customer, Item, Order
+from cleannest.orders import OrderWriter
+from cleannest.snapshot import bump_snapshot_version, snapshot_version
+
+
+CUSTOMER = Customer(
+    customer_id="1", customer_name="Customer 1", email=None, phone=None, address=None
+)
+TITAN_WASH = Item(name="TITAN Wash", category="service", cost=80.0)
+FOLD = Item(name="Fold", category="service", cost=35.0)
+
+
+@pytest.fixture
+def pool(tmp_path: Path) -> ConnectionPool:
+    pool = ConnectionPool(tmp_path / "main.db")
+    with pool.writer() as con:
+        bump_snapshot_version(con)
+    return pool
+
+
+def test_order_writer(pool: ConnectionPool):
+    writer = OrderWriter(pool.writer)
+    orders = [
+        Order(customer=CUSTOMER, items=[TITAN_WASH, TITAN_WASH, FOLD])
+        for _ in range(10)
+    ]
+    order_ids = [future.result(timeout=10) for future in map(writer.submit, orders)]
+    writer.close()
+
+    con = pool.cursor()
+    assert con.execute("SELECT count(*) FROM orders").fetchone() == (10,)
+    assert con.execute(
+        "SELECT item, variant, sum(quantity)::INTEGER, count(DISTINCT order_id) "
+        "FROM order_items GROUP BY ALL ORDER BY item"
+    ).fetchall() == [("fold", None, 10, 10), ("wash", "TITAN", 20, 10)]
+    assert con.execute(
+        "SELECT description, gross_sales::DOUBLE FROM orders WHERE order_id = ?",
+        [order_ids[0]],
+    ).fetchone() == ("2 x TITAN Wash, 1 x Fold", 195.0)
+
+    # Orders don't invalidate the dashboard's cached results
+    assert snapshot_version(con) == 1
+
+
+def test_order_writer_rejects_bad_orders_alone(pool: ConnectionPool):
+    writer = OrderWriter(pool.writer, max_wait=0.5)
+    good = writer.submit(Order(customer=CUSTOMER, items=[FOLD]))
+    # Too large for the orders' DECIMAL(10, 2) totals
+    priceless = Item(name="Fold", category="service", cost=1e10)
+    bad = writer.submit(Order(customer=CUSTOMER, items=[priceless]))
+    assert good.result(timeout=10)
+    with pytest.raises(Exception):
+        bad.result(timeout=10)
+    writer.close()
+
+    assert pool.cursor().execute("SELECT count(*) FROM orders").fetchone() == (1,)
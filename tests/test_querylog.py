@@ -0,0 +1,53 @@
+import json
+import logging
+
+import polars as pl
+import pytest
+
+from cleannest import querylog
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+def test_cache_hits_are_sampled(monkeypatch: pytest.MonkeyPatch):
+    handler = _Records()
+    logger = logging.getLogger("test.cleannest.queries")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    monkeypatch.setattr(querylog, "_logger", lambda: logger)
+    monkeypatch.setattr(querylog, "HIT_SAMPLE_RATE", 0.0)
+
+    querylog.log_query("FROM receipts", None, 1.0, 10, cached=True, page="a.py")
+    assert handler.records == []
+
+    # Misses and slow hits are always logged
+    querylog.log_query("FROM receipts", None, 1.0, 10, page="a.py")
+    slow_ms = querylog.SLOW_QUERY_MS + 1
+    querylog.log_query("FROM receipts", None, slow_ms, 10, cached=True, page="a.py")
+    assert [r["cached"] for r in handler.records] == [False, True]
+    assert [r["weight"] for r in handler.records] == [1.0, 1.0]
+
+
+def test_query_stats_weighs_sampled_hits():
+    log = pl.DataFrame(
+        {
+            "sql": ["FROM receipts"] * 3,
+            "duration_ms": [10.0, 0.1, 0.1],
+            "cached": [False, True, True],
+            "page": ["a.py"] * 3,
+            "profile": [None] * 3,
+            "weight": [None, 100.0, 100.0],
+        },
+        schema_overrides={"profile": pl.String},
+    )
+    stats = querylog.query_stats(log)
+    assert stats["n_calls"].to_list() == [201.0]
+    assert stats["cache_hit_rate"].to_list() == pytest.approx([200 / 201])
+    assert stats["mean_ms"].to_list() == [10.0]
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import duckdb
+import polars as pl
+
+import ingestion
+from rollups import build_summaries, check_summaries, maintain_summaries
+
+
+def test_maintain_summaries(con: duckdb.DuckDBPyConnection, receipt_exports: list[Path]):
+    receipts, items = ingestion._load_receipts(receipt_exports)
+    receipts, items, _ = ingestion._split_cancelled(receipts, items)
+    receipts = receipts.unique("receipt_id", keep="last")
+
+    history, batch = receipts.head(4_000), receipts.tail(receipts.height - 4_000)
+    with ingestion.transaction(con):
+        ingestion.write_table(con, history, "receipts")
+        build_summaries(con)
+
+    # New receipts, and old ones that moved to another customer and day
+    moved = history.head(50).with_columns(
+        pl.lit("Customer 99999").alias("customer_name"),
+        pl.col("timestamp") + pl.duration(days=3),
+    ).with_columns(
+        (pl.col("timestamp").dt.strftime("%Y%m%d").cast(pl.Int32)).alias("day_key")
+    )
+    deleted = history.slice(50, 20)["receipt_id"]
+    changes = pl.concat([batch, moved, history.slice(50, 20)])
+
+    with ingestion.transaction(con):
+        with maintain_summaries(con, changes):
+            ingestion.write_table(
+                con, pl.concat([batch, moved]), "receipts", "upsert", "receipt_id"
+            )
+            con.execute(
+                "DELETE FROM receipts WHERE receipt_id IN (SELECT unnest(?))",
+                [deleted.to_list()],
+            )
+
+    assert check_summaries(con) == {
+        "daily_summary": 0,
+        "monthly_summary": 0,
+        "hourly_weekday_summary": 0,
+        "customer_summary": 0,
+    }
+
+
+def test_check_summaries_finds_stale_rows(
+    con: duckdb.DuckDBPyConnection, receipt_exports: list[Path]
+):
+    receipts, _ = ingestion._load_receipts(receipt_exports[:1])
+    with ingestion.transaction(con):
+        ingestion.write_table(con, receipts.unique("receipt_id"), "receipts")
+        build_summaries(con)
+
+    con.execute("DELETE FROM receipts WHERE day_key = (SELECT min(day_key) FROM receipts)")
+    mismatches = check_summaries(con)
+    assert mismatches["daily_summary"] == 1
+    assert mismatches["monthly_summary"] == 2